@@ -1,22 +1,136 @@
 from flask import Flask, request, jsonify
 import json
 import logging
+import math
+import time
 from datetime import datetime
 import os
 from typing import Dict, List, Optional
 
+from sqlalchemy import event, inspect, select, update, case, or_
+from sqlalchemy.orm import joinedload
+
 from app import db
 from models import Item, Container, ItemPlacement, Log
 from utils.space_optimizer import SpaceOptimizer
+from utils.batch_packer import BatchPacker
 from utils.retrieval_optimizer import RetrievalOptimizer
 from utils.waste_manager import WasteManager
+from utils.search_index import NameSearchIndex
+from utils.station_simulator import StationSimulator
 
 logger = logging.getLogger(__name__)
 
 # Initialize utility classes
-space_optimizer = SpaceOptimizer()
+space_optimizer = SpaceOptimizer(
+    search_strategy=os.environ.get("PLACEMENT_SEARCH_STRATEGY", "vectorized"),
+    occupancy_backend=os.environ.get("PLACEMENT_OCCUPANCY_BACKEND", "dense"),
+    max_eviction_set_size=int(os.environ.get("PLACEMENT_MAX_EVICTIONS", 2)),
+    rearrangement_node_budget=int(os.environ.get("PLACEMENT_REARRANGEMENT_BUDGET", 200))
+)
+batch_packer = BatchPacker(space_optimizer)
 retrieval_optimizer = RetrievalOptimizer()
-waste_manager = WasteManager()
+waste_manager = WasteManager(space_optimizer, retrieval_optimizer)
+name_index = NameSearchIndex(max_age_seconds=float(os.environ.get("NAME_INDEX_MAX_AGE_SECONDS", 60)))
+station_simulator = StationSimulator()
+
+# Keep the name index in step with item rows as they are flushed
+@event.listens_for(Item, 'after_insert')
+def index_item_name(mapper, connection, target):
+    if name_index.is_built:
+        name_index.add_item(target.id, target.name)
+
+@event.listens_for(Item, 'after_update')
+def reindex_item_name(mapper, connection, target):
+    # Most updates touch uses or waste flags; only a rename changes the trigrams
+    if name_index.is_built and inspect(target).attrs.name.history.has_changes():
+        name_index.add_item(target.id, target.name)
+
+@event.listens_for(Item, 'after_delete')
+def unindex_item_name(mapper, connection, target):
+    if name_index.is_built:
+        name_index.remove_item(target.id)
+
+def get_name_index() -> NameSearchIndex:
+    """
+    The name index, (re)built from the item names on first use and once it is
+    older than its max age, so items added or renamed by other workers show up
+    """
+    if name_index.is_stale():
+        name_index.build(db.session.query(Item.id, Item.name).all())
+    return name_index
+
+def is_list_of_strings(values) -> bool:
+    """Check a JSON request field holds a list of strings, such as item IDs or names"""
+    return isinstance(values, list) and all(isinstance(value, str) for value in values)
+
+def invalidate_retrieval_costs_for_items(item_ids: List[str]):
+    """Drop the cached retrieval costs of every container holding one of the items"""
+    if not item_ids:
+        return
+    
+    container_ids = db.session.query(ItemPlacement.container_id).filter(
+        ItemPlacement.item_id.in_(item_ids)
+    ).distinct()
+    for (container_id,) in container_ids:
+        retrieval_optimizer.invalidate_retrieval_costs(container_id)
+
+def flag_new_waste_items(current_date: datetime) -> List[str]:
+    """
+    Flag every expired or used-up item as waste in one UPDATE statement and
+    return the IDs of the newly flagged items (not committed)
+    """
+    new_waste_filter = (
+        Item.is_waste.isnot(True),
+        or_(Item.expiry_date <= current_date, Item.remaining_uses <= 0)
+    )
+    
+    if db.engine.dialect.update_returning:
+        statement = update(Item).where(*new_waste_filter).values(is_waste=True).returning(Item.id)
+        return list(db.session.scalars(statement))
+    
+    # Without UPDATE ... RETURNING, find the IDs first and flag exactly those
+    item_ids = list(db.session.scalars(select(Item.id).where(*new_waste_filter)))
+    if item_ids:
+        db.session.execute(update(Item).where(Item.id.in_(item_ids)).values(is_waste=True))
+    return item_ids
+
+def load_retrieval_inventory(item_ids: List[str]):
+    """
+    Load only the containers holding one of the items and every placement in
+    them (the co-located ones can block the items), with their non-waste items
+    """
+    holding_containers = select(ItemPlacement.container_id).where(
+        ItemPlacement.item_id.in_(item_ids)
+    ).distinct()
+    containers = Container.query.filter(Container.id.in_(holding_containers)).all()
+    placements = ItemPlacement.query.filter(
+        ItemPlacement.container_id.in_(holding_containers)
+    ).options(joinedload(ItemPlacement.item)).order_by(ItemPlacement.id).all()
+    items = list({
+        p.item.id: p.item for p in placements if p.item is not None and not p.item.is_waste
+    }.values())
+    return items, containers, placements
+
+def record_retrieval(item: Item, container_id: str, astronaut_id: Optional[str]):
+    """Use up one use of a retrieved item and log the retrieval (not committed)"""
+    item.remaining_uses -= 1
+    
+    # Check if item is now waste
+    if item.should_be_waste():
+        item.is_waste = True
+        # Waste items no longer count as blockers in this container
+        retrieval_optimizer.invalidate_retrieval_costs(container_id)
+    
+    # Add log entry
+    log = Log(
+        action_type="retrieval",
+        item_id=item.id,
+        container_id=container_id,
+        astronaut_id=astronaut_id,
+        details=f"Item retrieved by {astronaut_id or 'unknown astronaut'}"
+    )
+    db.session.add(log)
 
 def register_api_routes(app: Flask):
     """Register all API routes with the Flask application"""
@@ -32,6 +146,22 @@ def register_api_routes(app: Flask):
             if not data or 'items' not in data or 'containers' not in data:
                 return jsonify({"success": False, "message": "Invalid request data"}), 400
             
+            # "greedy" places items one at a time with rearrangements,
+            # "batch" packs the whole manifest first-fit-decreasing
+            packing_mode = data.get('packingMode', 'greedy')
+            if packing_mode not in ('greedy', 'batch'):
+                return jsonify({"success": False, "message": f"Unknown packing mode: {packing_mode}"}), 400
+            
+            # Optional time budget for the whole request; when it runs out the
+            # best partial plan is returned along with the items left unplaced
+            deadline = None
+            if data.get('timeLimitMs') is not None:
+                time_limit_ms = data['timeLimitMs']
+                if isinstance(time_limit_ms, bool) or not isinstance(time_limit_ms, (int, float)) or \
+                   not math.isfinite(time_limit_ms) or time_limit_ms <= 0:
+                    return jsonify({"success": False, "message": "timeLimitMs must be a positive number"}), 400
+                deadline = time.monotonic() + time_limit_ms / 1000.0
+            
             # Process items from request
             items_data = data['items']
             items = []
@@ -82,16 +212,26 @@ def register_api_routes(app: Flask):
                 existing_placements[container.id] = container_placements
             
             # Run optimization algorithm
-            optimization_result = space_optimizer.optimize_placement_for_items(
-                items, containers, existing_placements
-            )
+            if packing_mode == 'batch':
+                optimization_result = batch_packer.pack_manifest(
+                    items, containers, existing_placements, deadline
+                )
+            else:
+                optimization_result = space_optimizer.optimize_placement_for_items(
+                    items, containers, existing_placements, deadline
+                )
             
             # Save new items and placements to database if optimization succeeded
             if optimization_result['success']:
+                # Stowed items whose cached blocker mass or footprint goes stale
+                resized_item_ids = []
                 for item in items:
                     # Check if item already exists
                     existing_item = Item.query.get(item.id)
                     if existing_item:
+                        if (existing_item.mass, existing_item.width, existing_item.depth, existing_item.height) != \
+                           (item.mass, item.width, item.depth, item.height):
+                            resized_item_ids.append(item.id)
                         # Update existing item
                         existing_item.name = item.name
                         existing_item.width = item.width
@@ -143,6 +283,14 @@ def register_api_routes(app: Flask):
                     db.session.add(log)
                 
                 db.session.commit()
+                
+                # Retrieval costs change in every container that got or gave up items
+                touched_containers = {p['containerId'] for p in optimization_result['placements']}
+                for step in optimization_result['rearrangements']:
+                    touched_containers.add(step.get('fromContainer') or step.get('toContainer'))
+                for container_id in touched_containers:
+                    retrieval_optimizer.invalidate_retrieval_costs(container_id)
+                invalidate_retrieval_costs_for_items(resized_item_ids)
             
             return jsonify(optimization_result)
             
@@ -163,14 +311,16 @@ def register_api_routes(app: Flask):
             if not item_name:
                 return jsonify({"success": False, "message": "Item name is required"}), 400
             
-            # Get all items, containers, and placements
-            items = Item.query.filter(Item.is_waste == False).all()
-            containers = Container.query.all()
-            placements = ItemPlacement.query.all()
+            matching_item_ids = get_name_index().search(item_name)
+            if not matching_item_ids:
+                return jsonify({"success": False, "message": "No matching items found"}), 404
+            
+            # Load only the rows the matches can touch
+            items, containers, placements = load_retrieval_inventory(matching_item_ids)
             
             # Find the optimal item to retrieve
             result = retrieval_optimizer.find_optimal_item_to_retrieve(
-                item_name, items, containers, placements
+                item_name, items, containers, placements, matching_item_ids
             )
             
             if not result:
@@ -179,22 +329,7 @@ def register_api_routes(app: Flask):
             # Update item usage count if retrieval is successful
             item = Item.query.get(result['item']['itemId'])
             if item:
-                item.remaining_uses -= 1
-                
-                # Check if item is now waste
-                if item.should_be_waste():
-                    item.is_waste = True
-                
-                # Add log entry
-                log = Log(
-                    action_type="retrieval",
-                    item_id=item.id,
-                    container_id=result['container']['containerId'],
-                    astronaut_id=astronaut_id,
-                    details=f"Item retrieved by {astronaut_id or 'unknown astronaut'}"
-                )
-                db.session.add(log)
-                
+                record_retrieval(item, result['container']['containerId'], astronaut_id)
                 db.session.commit()
             
             return jsonify({
@@ -211,28 +346,96 @@ def register_api_routes(app: Flask):
             db.session.rollback()
             return jsonify({"success": False, "message": str(e)}), 500
     
+    @app.route('/api/retrieve/batch', methods=['POST'])
+    def batch_retrieve():
+        """
+        API to retrieve several items, by name or ID, with one combined step plan
+        """
+        try:
+            data = request.json
+            
+            if not data or not (data.get('names') or data.get('itemIds')):
+                return jsonify({"success": False, "message": "Item names or IDs are required"}), 400
+            
+            names = data.get('names') or []
+            item_ids = data.get('itemIds') or []
+            astronaut_id = data.get('astronautId')
+            for field, values in (('names', names), ('itemIds', item_ids)):
+                if not is_list_of_strings(values):
+                    return jsonify({"success": False, "message": f"{field} must be a list of strings"}), 400
+            
+            # One ranked candidate list per request, names first
+            index = get_name_index() if names else None
+            candidate_lists = [index.search(name) for name in names] + [[item_id] for item_id in item_ids]
+            queries = [{"name": name} for name in names] + [{"itemId": item_id} for item_id in item_ids]
+            
+            # Load the rows for every request at once
+            all_candidate_ids = list({item_id for candidates in candidate_lists for item_id in candidates})
+            items, containers, placements = load_retrieval_inventory(all_candidate_ids)
+            
+            plan = retrieval_optimizer.plan_batch_retrieval(candidate_lists, items, containers, placements)
+            
+            # The planned items are among the rows just loaded, so no query per retrieval
+            items_by_id = {item.id: item for item in items}
+            retrievals = []
+            for retrieval in plan['retrievals']:
+                item = items_by_id[retrieval['item']['itemId']]
+                record_retrieval(item, retrieval['container']['containerId'], astronaut_id)
+                retrievals.append({
+                    "query": queries[retrieval['request']],
+                    "item": retrieval['item'],
+                    "container": retrieval['container'],
+                    "isNowWaste": item.is_waste
+                })
+            
+            db.session.commit()
+            
+            return jsonify({
+                "success": len(plan['unresolved']) == 0,
+                "retrievals": retrievals,
+                "notFound": [queries[index] for index in plan['unresolved']],
+                "retrievalSteps": plan['retrievalSteps'],
+                "stepsRequired": plan['stepsRequired']
+            })
+            
+        except Exception as e:
+            logger.exception("Error in batch retrieval")
+            db.session.rollback()
+            return jsonify({"success": False, "message": str(e)}), 500
+    
     @app.route('/api/waste/identify', methods=['GET'])
     def identify_waste():
         """
-        API to identify waste items
+        API to identify waste items.
+        Flags new waste in the database directly and returns one page of all
+        waste items (page and pageSize query parameters)
         """
         try:
-            # Get all items from database
-            items = Item.query.all()
-            
-            # Identify waste items
-            waste_items = waste_manager.identify_waste_items(items)
+            try:
+                page = int(request.args.get('page', 1))
+                page_size = int(request.args.get('pageSize', 100))
+            except ValueError:
+                return jsonify({"success": False, "message": "page and pageSize must be integers"}), 400
+            if page < 1 or not 1 <= page_size <= 1000:
+                return jsonify({"success": False, "message": "page must be at least 1 and pageSize between 1 and 1000"}), 400
             
             # Update waste flag in database
-            for item in waste_items:
-                item.is_waste = True
-            
+            new_waste_ids = flag_new_waste_items(datetime.now())
             db.session.commit()
+            invalidate_retrieval_costs_for_items(new_waste_ids)
+            
+            # One page of the full list, including items flagged earlier
+            waste_query = Item.query.filter(Item.is_waste.is_(True))
+            total_waste = waste_query.count()
+            waste_items = waste_query.order_by(Item.id).offset((page - 1) * page_size).limit(page_size).all()
             
             return jsonify({
                 "success": True,
+                "newWasteItemIds": new_waste_ids,
                 "wasteItems": [item.to_dict() for item in waste_items],
-                "totalWaste": len(waste_items)
+                "totalWaste": total_waste,
+                "page": page,
+                "pageSize": page_size
             })
             
         except Exception as e:
@@ -262,12 +465,15 @@ def register_api_routes(app: Flask):
             # Get waste items
             waste_items = Item.query.filter_by(is_waste=True).all()
             
-            # Get current placements
-            placements = ItemPlacement.query.all()
+            # Get current placements, with the items stowed in them since any of
+            # them can block the waste on its way out
+            placements = ItemPlacement.query.options(joinedload(ItemPlacement.item)).order_by(ItemPlacement.id).all()
+            stowed_items = list({p.item.id: p.item for p in placements if p.item is not None}.values())
+            containers = Container.query.all()
             
             # Plan waste disposal
             disposal_plan = waste_manager.plan_waste_disposal(
-                waste_items, undocking_container, placements, weight_limit
+                waste_items, undocking_container, placements, weight_limit, containers, stowed_items
             )
             
             return jsonify({
@@ -292,31 +498,55 @@ def register_api_routes(app: Flask):
             
             days = data['days']
             used_items = data.get('usedItems', [])
+            current_date, new_date = waste_manager.get_simulation_window(days)
+            
+            # Mark used items, one use per mention, in a single statement
+            new_waste_ids = []
+            if used_items:
+                use_counts = {}
+                for used_item_id in used_items:
+                    use_counts[used_item_id] = use_counts.get(used_item_id, 0) + 1
+                
+                Item.query.filter(Item.id.in_(use_counts)).update(
+                    {Item.remaining_uses: Item.remaining_uses - case(use_counts, value=Item.id, else_=0)},
+                    synchronize_session=False
+                )
+                
+                # Check if the used items are now waste
+                new_waste_filter = (
+                    Item.id.in_(use_counts),
+                    Item.is_waste.isnot(True),
+                    or_(Item.remaining_uses <= 0, Item.expiry_date < current_date)
+                )
+                new_waste_ids = [item_id for (item_id,) in db.session.query(Item.id).filter(*new_waste_filter)]
+                if new_waste_ids:
+                    Item.query.filter(Item.id.in_(new_waste_ids)).update(
+                        {Item.is_waste: True}, synchronize_session=False
+                    )
             
-            # Get all items from database
-            items = Item.query.all()
-            
-            # Mark used items
-            for used_item_id in used_items:
-                item = Item.query.get(used_item_id)
-                if item:
-                    item.remaining_uses -= 1
-                    
-                    # Check if item is now waste
-                    if item.should_be_waste():
-                        item.is_waste = True
+            # Only the items expiring within the window, found through the expiry date index
+            expiring_items = Item.query.filter(
+                Item.is_waste.isnot(True),
+                Item.expiry_date > current_date,
+                Item.expiry_date <= new_date
+            ).order_by(Item.expiry_date).all()
             
             # Simulate time advancement
-            simulation_result = waste_manager.simulate_time_advancement(items, days)
+            simulation_result = waste_manager.simulate_time_advancement(expiring_items, days, current_date)
             
             if simulation_result['success']:
                 # Update items that expired due to time advancement
-                for expired_item_data in simulation_result['changes']['expiredItems']:
-                    item = Item.query.get(expired_item_data['itemId'])
-                    if item:
-                        item.is_waste = True
+                expired_ids = [expired_item['itemId'] for expired_item in simulation_result['changes']['expiredItems']]
+                if expired_ids:
+                    Item.query.filter(Item.id.in_(expired_ids)).update(
+                        {Item.is_waste: True}, synchronize_session=False
+                    )
+                new_waste_ids.extend(expired_ids)
                 
                 db.session.commit()
+                invalidate_retrieval_costs_for_items(new_waste_ids)
+            else:
+                db.session.rollback()
             
             return jsonify(simulation_result)
             
@@ -325,6 +555,68 @@ def register_api_routes(app: Flask):
             db.session.rollback()
             return jsonify({"success": False, "message": str(e)}), 500
     
+    @app.route('/api/simulation/run', methods=['POST'])
+    def run_simulation():
+        """
+        API to run a multi-day what-if scenario with per-day usage schedules.
+        The database is only updated at the end, and only when commit is set
+        """
+        try:
+            data = request.json
+            
+            if not data or 'days' not in data:
+                return jsonify({"success": False, "message": "Number of days is required"}), 400
+            
+            days = data['days']
+            daily_usage = data.get('dailyUsage') or []
+            commit = data.get('commit', False)
+            if isinstance(days, bool) or not isinstance(days, int) or days <= 0:
+                return jsonify({"success": False, "message": "days must be a positive integer"}), 400
+            if not isinstance(commit, bool):
+                return jsonify({"success": False, "message": "commit must be true or false"}), 400
+            if not is_list_of_strings(daily_usage):
+                return jsonify({"success": False, "message": "Daily usage must be a list of item IDs"}), 400
+            try:
+                usage_schedule = {int(day): item_ids for day, item_ids in (data.get('usageSchedule') or {}).items()}
+            except (AttributeError, ValueError):
+                usage_schedule = None
+            if usage_schedule is None or not all(is_list_of_strings(item_ids) for item_ids in usage_schedule.values()):
+                return jsonify({"success": False, "message": "Usage schedule must map day numbers to item IDs"}), 400
+            
+            # Only the columns the simulation needs, without building Item objects
+            items = db.session.query(
+                Item.id, Item.remaining_uses, Item.expiry_date, Item.mass, Item.priority, Item.is_waste
+            ).all()
+            
+            simulation_result = station_simulator.run(items, days, usage_schedule, daily_usage)
+            if not simulation_result['success']:
+                return jsonify(simulation_result), 400
+            
+            final_state = simulation_result['finalState']
+            if commit:
+                # Write back the final state, one statement per column
+                remaining_uses = final_state['remainingUses']
+                if remaining_uses:
+                    Item.query.filter(Item.id.in_(remaining_uses)).update(
+                        {Item.remaining_uses: case(remaining_uses, value=Item.id)},
+                        synchronize_session=False
+                    )
+                if final_state['newWasteItems']:
+                    Item.query.filter(Item.id.in_(final_state['newWasteItems'])).update(
+                        {Item.is_waste: True}, synchronize_session=False
+                    )
+                
+                db.session.commit()
+                invalidate_retrieval_costs_for_items(final_state['newWasteItems'])
+            
+            simulation_result['committed'] = commit
+            return jsonify(simulation_result)
+            
+        except Exception as e:
+            logger.exception("Error running simulation")
+            db.session.rollback()
+            return jsonify({"success": False, "message": str(e)}), 500
+    
     @app.route('/api/containers', methods=['GET'])
     def get_containers():
         """
@@ -374,6 +666,10 @@ def register_api_routes(app: Flask):
             
             db.session.commit()
             
+            # Drop the cached occupancy grid and spatial index for the deleted container
+            space_optimizer.reset_container_space(container_id)
+            retrieval_optimizer.reset_container_index(container_id)
+            
             return jsonify({
                 "success": True,
                 "message": f"Container {container_id} deleted successfully"
@@ -536,6 +832,10 @@ def register_api_routes(app: Flask):
             
             db.session.commit()
             
+            # The container is now empty, drop its cached occupancy grid and spatial index
+            space_optimizer.reset_container_space(container_id)
+            retrieval_optimizer.reset_container_index(container_id)
+            
             return jsonify({
                 "success": True,
                 "containerId": container_id,
@@ -37,6 +37,9 @@ with app.app_context():
     
     logger.info("Creating database tables...")
     db.create_all()
+    # create_all skips tables that already exist, so add indexes introduced since
+    for index in Item.__table__.indexes:
+        index.create(db.engine, checkfirst=True)
     logger.info("Database tables created successfully.")
 
 # Import and register routes
@@ -1,11 +1,14 @@
 import datetime
 from app import db
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Boolean, Index
 from sqlalchemy.orm import relationship
 
 class Item(db.Model):
     """Model representing a cargo item"""
     __tablename__ = 'items'
+    __table_args__ = (
+        Index('ix_items_is_waste_id', 'is_waste', 'id'),  # Counts and pages of waste items in id order
+    )
     
     id = Column(String(50), primary_key=True)  # Item ID
     name = Column(String(100), nullable=False)
@@ -14,9 +17,9 @@ class Item(db.Model):
     height = Column(Float, nullable=False)  # in cm
     mass = Column(Float, nullable=False)  # in kg
     priority = Column(Integer, nullable=False)  # 0-100
-    expiry_date = Column(DateTime, nullable=True)  # ISO format date
+    expiry_date = Column(DateTime, nullable=True, index=True)  # ISO format date, indexed for expiry range queries
     usage_limit = Column(Integer, nullable=False)  # Number of uses
-    remaining_uses = Column(Integer, nullable=False)  # Current uses left
+    remaining_uses = Column(Integer, nullable=False, index=True)  # Current uses left, indexed for waste identification
     preferred_zone = Column(String(100), nullable=True)
     is_waste = Column(Boolean, default=False)  # Flag for waste items
     
@@ -0,0 +1,32 @@
+import os
+import sys
+
+import pytest
+
+# Importing the app creates the tables, so point it at a throwaway database first
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402  (registers the models before the tests import them)
+import api_routes  # noqa: E402
+
+
+@pytest.fixture
+def client():
+    """
+    Test client with an app context. Every table is emptied afterwards and the
+    route singletons forget the containers and names they cached
+    """
+    with app.app.app_context():
+        yield app.app.test_client()
+        
+        app.db.session.remove()
+        for table in reversed(app.db.metadata.sorted_tables):
+            app.db.session.execute(table.delete())
+        app.db.session.commit()
+        
+        for container_id in list(api_routes.space_optimizer.container_versions):
+            api_routes.space_optimizer.reset_container_space(container_id)
+        for container_id in list(api_routes.retrieval_optimizer.container_indexes):
+            api_routes.retrieval_optimizer.reset_container_index(container_id)
+        api_routes.name_index.is_built = False
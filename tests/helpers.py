@@ -0,0 +1,38 @@
+from models import Item, ItemPlacement
+
+
+def make_item(item_id, width, depth, height, priority=50, zone="Lab"):
+    return Item(
+        id=item_id, name=item_id, width=width, depth=depth, height=height, mass=1.0,
+        priority=priority, usage_limit=1, remaining_uses=1, preferred_zone=zone
+    )
+
+
+def make_placement(item_id, container_id, start, end):
+    return ItemPlacement(
+        item_id=item_id, container_id=container_id,
+        start_width=start[0], start_depth=start[1], start_height=start[2],
+        end_width=end[0], end_depth=end[1], end_height=end[2]
+    )
+
+
+def boxes_overlap(a, b):
+    return all(a[i] < b[i + 3] and b[i] < a[i + 3] for i in range(3))
+
+
+def position_box(position):
+    return tuple(position["startCoordinates"][k] for k in ("width", "depth", "height")) + \
+        tuple(position["endCoordinates"][k] for k in ("width", "depth", "height"))
+
+
+def placed_boxes(result):
+    return [position_box(p["position"]) for p in result["placements"]]
+
+
+def stow(db, container, *contents):
+    """Add a container and its (item, start, end) contents to the database"""
+    db.session.add(container)
+    for item, start, end in contents:
+        db.session.add(item)
+        db.session.add(make_placement(item.id, container.id, start, end))
+    db.session.commit()
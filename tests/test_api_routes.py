@@ -0,0 +1,223 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+import api_routes
+from app import db
+from models import Container, Item
+from utils.search_index import NameSearchIndex
+from tests.helpers import make_item, stow
+
+
+def placement_request(**extra):
+    body = {
+        "items": [{"itemId": "I1", "name": "Kit", "width": 2, "depth": 2, "height": 2, "priority": 50}],
+        "containers": [{"containerId": "C1", "zone": "Lab", "width": 4, "depth": 4, "height": 4}]
+    }
+    body.update(extra)
+    return body
+
+
+@pytest.mark.parametrize("time_limit", ["fast", -5, 0, True, [100]])
+def test_placement_rejects_invalid_time_limits(client, time_limit):
+    response = client.post("/api/placement", json=placement_request(timeLimitMs=time_limit))
+    
+    assert response.status_code == 400
+    assert "timeLimitMs" in response.get_json()["message"]
+
+
+def test_placement_within_time_limit_reports_no_deadline_hit(client):
+    response = client.post("/api/placement", json=placement_request(timeLimitMs=60000))
+    
+    result = response.get_json()
+    assert response.status_code == 200
+    assert len(result["placements"]) == 1
+    assert result["deadlineExceeded"] is False
+
+
+def test_name_index_is_updated_only_when_a_name_changes(client, monkeypatch):
+    monkeypatch.setattr(api_routes, "name_index", NameSearchIndex())
+    item = make_item("I1", 1, 1, 1)
+    item.name = "Oxygen Tank"
+    db.session.add(item)
+    db.session.commit()
+    index = api_routes.get_name_index()
+    reindexed = []
+    add_item = index.add_item
+    monkeypatch.setattr(index, "add_item", lambda item_id, name: reindexed.append(item_id) or add_item(item_id, name))
+    
+    item.remaining_uses = 0
+    db.session.commit()
+    assert reindexed == []
+    
+    item.name = "Water Bag"
+    db.session.commit()
+    assert reindexed == ["I1"]
+    assert index.search("water") == ["I1"]
+    assert index.search("oxygen") == []
+
+
+def stow_food_packets():
+    # Two copies of the same item: one behind a water bag, one at the open face
+    blocked = make_item("F1", 2, 2, 2, priority=50)
+    blocked.name = "Food Packet"
+    reachable = make_item("F2", 2, 2, 2, priority=50)
+    reachable.name = "Food Packet"
+    water = make_item("W1", 2, 2, 2, priority=50)
+    water.name = "Water Bag"
+    stow(db, Container(id="C1", zone="Lab", width=4, depth=4, height=4),
+         (water, (0, 0, 0), (2, 2, 2)), (blocked, (0, 2, 0), (2, 4, 2)))
+    stow(db, Container(id="C2", zone="Lab", width=4, depth=4, height=4), (reachable, (0, 0, 0), (2, 2, 2)))
+    stow(db, Container(id="C3", zone="Lab", width=4, depth=4, height=4),
+         (make_item("S1", 1, 1, 1), (0, 0, 0), (1, 1, 1)))
+
+
+def test_retrieval_inventory_holds_only_the_containers_of_the_items(client):
+    stow_food_packets()
+    
+    items, containers, placements = api_routes.load_retrieval_inventory(["F1"])
+    
+    assert [c.id for c in containers] == ["C1"]
+    assert sorted(p.item_id for p in placements) == ["F1", "W1"]
+    assert sorted(i.id for i in items) == ["F1", "W1"]
+
+
+def test_search_retrieves_the_most_accessible_match(client):
+    stow_food_packets()
+    
+    response = client.get("/api/search", query_string={"name": "food", "astronautId": "A1"})
+    
+    result = response.get_json()
+    assert result["item"]["itemId"] == "F2"
+    assert result["stepsRequired"] == 0
+    assert db.session.get(Item, "F2").remaining_uses == 0
+    assert result["isNowWaste"] is True
+
+
+@pytest.mark.parametrize("mass, invalidated", [(1.0, False), (25.0, True)])
+def test_changing_a_stowed_item_drops_cached_retrieval_costs(client, mass, invalidated):
+    stow_food_packets()
+    client.get("/api/search", query_string={"name": "food"})
+    assert "C1" in api_routes.retrieval_optimizer.retrieval_costs
+    
+    water = {"itemId": "W1", "name": "Water Bag", "width": 2, "depth": 2, "height": 2, "mass": mass, "priority": 50}
+    spare = {"containerId": "C9", "zone": "Lab", "width": 4, "depth": 4, "height": 4}
+    response = client.post("/api/placement", json={"items": [water], "containers": [spare]})
+    
+    assert response.get_json()["success"] is True
+    assert ("C1" not in api_routes.retrieval_optimizer.retrieval_costs) == invalidated
+
+
+@pytest.mark.parametrize("body", [{"names": "food"}, {"itemIds": ["F1", 2]}, {"names": [None]}, {"itemIds": {"F1": 1}}])
+def test_batch_retrieval_rejects_malformed_requests(client, body):
+    response = client.post("/api/retrieve/batch", json=body)
+    
+    assert response.status_code == 400
+
+
+def test_batch_retrieval_takes_each_blocker_out_once(client):
+    stow_food_packets()
+    selects = []
+    
+    def record_select(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("SELECT"):
+            selects.append(statement)
+    
+    event.listen(db.engine, "before_cursor_execute", record_select)
+    try:
+        response = client.post("/api/retrieve/batch", json={"names": ["food", "food"], "itemIds": ["X9"]})
+    finally:
+        event.remove(db.engine, "before_cursor_execute", record_select)
+    
+    result = response.get_json()
+    assert [r["item"]["itemId"] for r in result["retrievals"]] == ["F2", "F1"]
+    assert result["notFound"] == [{"itemId": "X9"}]
+    assert [(s["action"], s["itemId"]) for s in result["retrievalSteps"]] == [
+        ("retrieve", "F2"), ("remove", "W1"), ("retrieve", "F1"), ("place", "W1")
+    ]
+    assert db.session.get(Item, "F1").remaining_uses == 0
+    # The retrieved rows come from the inventory load, not one query per retrieval
+    assert not any("WHERE items.id = ?" in statement for statement in selects)
+
+
+def stow_consumables():
+    now = datetime.now()
+    items = [make_item(item_id, 1, 1, 1) for item_id in ("A", "B", "C", "D")]
+    items[0].usage_limit = items[0].remaining_uses = 3
+    items[2].expiry_date = now + timedelta(days=2)
+    items[3].expiry_date = now + timedelta(days=10)
+    stow(db, Container(id="C1", zone="Lab", width=4, depth=4, height=4),
+         *((item, (index, 0, 0), (index + 1, 1, 1)) for index, item in enumerate(items)))
+
+
+def test_time_jump_applies_uses_and_expiries_in_bulk(client):
+    stow_consumables()
+    
+    response = client.post("/api/simulation/time", json={"days": 3, "usedItems": ["A", "A", "B", "D"]})
+    
+    result = response.get_json()
+    assert [item["itemId"] for item in result["changes"]["expiredItems"]] == ["C"]
+    remaining = {item.id: (item.remaining_uses, item.is_waste) for item in Item.query.all()}
+    assert remaining == {"A": (1, False), "B": (0, True), "C": (1, True), "D": (0, True)}
+
+
+@pytest.mark.parametrize("body", [
+    {"days": 3, "usageSchedule": {"two": ["A"]}},
+    {"days": 3, "usageSchedule": {"2": "A"}},
+    {"days": 3, "usageSchedule": {"2": [1]}},
+    {"days": 3, "usageSchedule": ["A"]},
+    {"days": 3, "dailyUsage": "A"},
+    {"days": "3"},
+    {"days": 2.5},
+    {"days": None},
+    {"days": True},
+    {"days": 0},
+    {"days": 3, "commit": "false"},
+    {"days": 3, "commit": 1}
+])
+def test_simulation_rejects_malformed_requests(client, body):
+    response = client.post("/api/simulation/run", json=body)
+    
+    assert response.status_code == 400
+
+
+def test_simulation_is_only_written_back_on_commit(client):
+    stow_consumables()
+    body = {"days": 3, "dailyUsage": ["A"], "usageSchedule": {"2": ["B", "X"]}}
+    
+    preview = client.post("/api/simulation/run", json=body).get_json()
+    assert preview["committed"] is False
+    assert preview["unknownItems"] == ["X"]
+    assert preview["totals"]["itemUses"] == 4
+    assert sorted(preview["finalState"]["newWasteItems"]) == ["A", "B", "C"]
+    assert db.session.get(Item, "A").remaining_uses == 3
+    
+    committed = client.post("/api/simulation/run", json=dict(body, commit=True)).get_json()
+    assert committed["committed"] is True
+    assert {item.id for item in Item.query.filter_by(is_waste=True)} == {"A", "B", "C"}
+
+
+def test_waste_identification_flags_new_waste_and_pages_the_list(client):
+    stow_consumables()
+    expired = make_item("E", 1, 1, 1)
+    expired.expiry_date = datetime.now() - timedelta(days=1)
+    spent = make_item("U", 1, 1, 1)
+    spent.remaining_uses = 0
+    flagged = make_item("G", 1, 1, 1)
+    flagged.is_waste = True
+    stow(db, Container(id="C2", zone="Lab", width=4, depth=4, height=4),
+         (expired, (0, 0, 0), (1, 1, 1)), (spent, (1, 0, 0), (2, 1, 1)), (flagged, (2, 0, 0), (3, 1, 1)))
+    
+    first = client.get("/api/waste/identify", query_string={"pageSize": 2}).get_json()
+    second = client.get("/api/waste/identify", query_string={"page": 2, "pageSize": 2}).get_json()
+    
+    assert sorted(first["newWasteItemIds"]) == ["E", "U"]
+    assert second["newWasteItemIds"] == []
+    assert first["totalWaste"] == second["totalWaste"] == 3
+    assert [item["itemId"] for item in first["wasteItems"] + second["wasteItems"]] == ["E", "G", "U"]
+
+
+@pytest.mark.parametrize("query", [{"page": "one"}, {"page": 0}, {"pageSize": 5000}])
+def test_waste_identification_rejects_bad_pages(client, query):
+    assert client.get("/api/waste/identify", query_string=query).status_code == 400
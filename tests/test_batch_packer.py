@@ -0,0 +1,44 @@
+from models import Container
+from utils.space_optimizer import SpaceOptimizer
+from utils.batch_packer import BatchPacker
+from tests.helpers import make_item, boxes_overlap, placed_boxes
+
+
+def test_manifest_is_sorted_by_tier_then_volume():
+    packer = BatchPacker(SpaceOptimizer())
+    items = [
+        make_item("small-high", 1, 1, 1, priority=90),
+        make_item("large-low", 4, 4, 4, priority=10),
+        make_item("large-high", 3, 3, 3, priority=80),
+        make_item("medium-low", 2, 2, 2, priority=20)
+    ]
+    
+    order = [item.id for item in packer.sort_manifest(items)]
+    
+    assert order == ["large-high", "small-high", "large-low", "medium-low"]
+
+
+def test_manifest_is_packed_across_containers_without_overlap():
+    containers = [Container(id=f"C{i}", zone="Lab", width=4, depth=4, height=4) for i in range(2)]
+    items = [make_item(f"I{i}", 2, 2, 4, priority=10 * i) for i in range(8)]
+    
+    result = BatchPacker(SpaceOptimizer()).pack_manifest(items, containers, {})
+    
+    assert result["success"] is True
+    assert result["rearrangements"] == []
+    assert {p["containerId"] for p in result["placements"]} == {"C0", "C1"}
+    for container in containers:
+        boxes = placed_boxes({"placements": [p for p in result["placements"] if p["containerId"] == container.id]})
+        assert not any(boxes_overlap(a, b) for i, a in enumerate(boxes) for b in boxes[i + 1:])
+
+
+def test_items_that_fit_nowhere_skip_repeated_searches():
+    container = Container(id="C1", zone="Lab", width=4, depth=4, height=4)
+    items = [make_item("fits", 4, 4, 2)] + [make_item(f"big{i}", 3, 3, 3) for i in range(3)]
+    
+    result = BatchPacker(SpaceOptimizer()).pack_manifest(items, [container], {})
+    
+    assert [p["itemId"] for p in result["placements"]] == ["fits"]
+    assert {u["reason"] for u in result["unplacedItems"]} == {"no_space"}
+    assert result["stats"]["skippedSearches"] == 2
+    assert result["deadlineExceeded"] is False
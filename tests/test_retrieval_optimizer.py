@@ -0,0 +1,61 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import Container
+from utils.retrieval_optimizer import RetrievalOptimizer
+from tests.helpers import make_item, make_placement
+
+
+def random_inventory(seed):
+    rng = random.Random(seed)
+    containers = [Container(id=f"C{i}", zone="Lab", width=12, depth=12, height=12) for i in range(3)]
+    items, placements = [], []
+    for index in range(60):
+        item = make_item(f"I{index}", 2, 2, 2, priority=rng.randint(0, 100))
+        item.name = rng.choice(["Food Packet", "Water Bag"])
+        item.mass = rng.uniform(0.5, 20)
+        if rng.random() < 0.5:
+            item.expiry_date = datetime.now() + timedelta(days=rng.randint(-5, 150), hours=12)
+        start = (rng.randint(0, 10), rng.randint(0, 10), rng.randint(0, 10))
+        placement = make_placement(item.id, rng.choice(containers).id, start, tuple(s + 2 for s in start))
+        placement.id = index + 1
+        items.append(item)
+        placements.append(placement)
+    return items, containers, placements
+
+
+def loop_score(optimizer, item, placement, containers, items, placements):
+    container = next(c for c in containers if c.id == placement.container_id)
+    complexity, _ = optimizer.calculate_retrieval_complexity(item, placement, container, items, placements)
+    expiry_factor = 0.0
+    if item.expiry_date:
+        days_until_expiry = (item.expiry_date - datetime.now()).days
+        if days_until_expiry > 0:
+            expiry_factor = max(0, 100 - days_until_expiry) * 0.5
+    return complexity - item.priority * 0.5 - expiry_factor
+
+
+def test_vectorized_scoring_picks_the_best_loop_score():
+    for seed in range(5):
+        items, containers, placements = random_inventory(seed)
+        optimizer = RetrievalOptimizer()
+        
+        result = optimizer.find_optimal_item_to_retrieve("food", items, containers, placements)
+        
+        scores = {
+            item.id: loop_score(RetrievalOptimizer(), item, placement, containers, items, placements)
+            for item, placement in zip(items, placements) if "food" in item.name.lower()
+        }
+        assert scores[result["item"]["itemId"]] == pytest.approx(min(scores.values()))
+
+
+def test_steps_are_spelled_out_only_for_the_winner():
+    items, containers, placements = random_inventory(7)
+    optimizer = RetrievalOptimizer()
+    
+    result = optimizer.find_optimal_item_to_retrieve("water", items, containers, placements)
+    
+    assert {step["itemId"] for step in result["retrievalSteps"] if step["action"] == "retrieve"} <= {result["item"]["itemId"]}
+    assert result["stepsRequired"] == len(result["retrievalSteps"])
@@ -0,0 +1,51 @@
+import random
+
+from utils.search_index import NameSearchIndex
+
+
+def test_search_matches_a_substring_scan():
+    rng = random.Random(0)
+    names = {f"I{i}": "".join(rng.choice("abc ") for _ in range(rng.randint(0, 12))) for i in range(300)}
+    index = NameSearchIndex()
+    index.build(names.items())
+    
+    for query in ["a", "ab", "abc", "ca b", "bbb", "Cab", "xyz", " "]:
+        expected = {item_id for item_id, name in names.items() if query.lower() in name.lower()}
+        assert set(index.search(query)) == expected
+
+
+def test_search_ranks_exact_then_prefix_then_word_start():
+    index = NameSearchIndex()
+    index.build([("1", "Food Packet"), ("2", "Dry Food"), ("3", "Seafood"), ("4", "Food"), ("5", "Water")])
+    
+    assert index.search("food") == ["4", "1", "2", "3"]
+    assert index.search("food", limit=2) == ["4", "1"]
+
+
+def test_renamed_and_removed_items_leave_no_stale_postings():
+    index = NameSearchIndex()
+    index.build([("1", "Oxygen Tank"), ("2", "Tank Valve")])
+    
+    index.add_item("1", "Water Bag")
+    index.remove_item("2")
+    
+    assert index.search("tank") == []
+    assert index.search("water") == ["1"]
+    assert all(item_ids for item_ids in index.trigrams.values())
+    assert set().union(*index.trigrams.values()) == {"1"}
+
+
+def test_index_is_stale_until_built_and_after_its_max_age(monkeypatch):
+    index = NameSearchIndex(max_age_seconds=60)
+    assert index.is_stale()
+    
+    index.build([("1", "Oxygen Tank")])
+    assert not index.is_stale()
+    
+    built_at = index.built_at
+    monkeypatch.setattr("utils.search_index.time.monotonic", lambda: built_at + 61)
+    assert index.is_stale()
+    
+    unbounded = NameSearchIndex()
+    unbounded.build([("1", "Oxygen Tank")])
+    assert not unbounded.is_stale()
@@ -0,0 +1,381 @@
+import threading
+import time
+import numpy as np
+
+from models import Container
+from utils.space_optimizer import SpaceOptimizer
+from tests.helpers import make_item, make_placement, boxes_overlap, position_box, placed_boxes
+
+
+def test_rearrangement_keeps_other_planned_placements():
+    # Both placements are planned in this batch, so neither has a row id yet
+    lab = Container(id="C1", zone="Lab", width=4, depth=4, height=4)
+    spare = Container(id="C2", zone="Storage", width=4, depth=4, height=4)
+    evicted = make_item("L1", 2, 4, 4, priority=1)
+    kept = make_item("L2", 2, 4, 4, priority=2)
+    new_item = make_item("N", 2, 4, 4, priority=90)
+    kept_placement = make_placement("L2", "C1", (0, 0, 0), (2, 4, 4))
+    existing = {
+        "C1": [make_placement("L1", "C1", (2, 0, 0), (4, 4, 4)), kept_placement],
+        "C2": []
+    }
+    
+    result = SpaceOptimizer().attempt_rearrangement(
+        new_item, [lab, spare], existing, 1, [evicted, kept, new_item]
+    )
+    
+    assert result is not None
+    assert result["placement"]["containerId"] == "C1"
+    new_box = position_box(result["placement"]["position"])
+    kept_box = (0, 0, 0, 2, 4, 4)
+    assert not boxes_overlap(new_box, kept_box)
+
+
+def random_matrix(seed, shape=(5, 6, 7)):
+    return (np.random.default_rng(seed).random(shape) < 0.3).astype(np.int8)
+
+
+def test_prefix_sums_count_every_box():
+    optimizer = SpaceOptimizer()
+    space_matrix = random_matrix(0)
+    prefix_sums = optimizer.compute_prefix_sums(space_matrix)
+    
+    for start_w, start_d, start_h, end_w, end_d, end_h in [(0, 0, 0, 5, 6, 7), (1, 2, 3, 4, 5, 6), (2, 0, 1, 3, 6, 2)]:
+        expected = int(space_matrix[start_w:end_w, start_d:end_d, start_h:end_h].sum())
+        assert optimizer.count_occupied(prefix_sums, start_w, start_d, start_h, end_w, end_d, end_h) == expected
+
+
+def test_update_space_matrix_keeps_prefix_sums_in_sync():
+    optimizer = SpaceOptimizer()
+    space_matrix = random_matrix(1)
+    prefix_sums = optimizer.compute_prefix_sums(space_matrix)
+    
+    optimizer.update_space_matrix(space_matrix, 1, 1, 1, 4, 3, 5, value=1, prefix_sums=prefix_sums)
+    optimizer.update_space_matrix(space_matrix, 0, 2, 0, 2, 6, 3, value=0, prefix_sums=prefix_sums)
+    
+    assert np.array_equal(prefix_sums, optimizer.compute_prefix_sums(space_matrix))
+
+
+def test_placements_never_overlap():
+    container = Container(id="C1", zone="Lab", width=10, depth=10, height=10)
+    items = [make_item(f"I{i}", 3 + i % 3, 4, 2 + i % 4) for i in range(12)]
+    
+    result = SpaceOptimizer().optimize_placement_for_items(items, [container], {})
+    
+    boxes = placed_boxes(result)
+    assert len(boxes) > 1
+    assert all(end <= 10 for box in boxes for end in box[3:])
+    assert not any(boxes_overlap(a, b) for i, a in enumerate(boxes) for b in boxes[i + 1:])
+
+
+def test_prefix_sum_cache_is_bounded():
+    optimizer = SpaceOptimizer(prefix_cache_size=2)
+    containers = [Container(id=f"C{i}", zone="Lab", width=4, depth=4, height=4) for i in range(4)]
+    
+    for container in containers:
+        optimizer.get_container_prefix_sums(container, [])
+    
+    assert list(optimizer.container_prefix_sums) == ["C2", "C3"]
+    assert set(optimizer.container_spaces) == {"C0", "C1", "C2", "C3"}
+
+
+def test_extreme_point_positions_are_valid_scan_positions():
+    optimizer = SpaceOptimizer(search_strategy="extreme_point")
+    container = Container(id="C1", zone="Lab", width=8, depth=8, height=8)
+    placements = [make_placement("A", "C1", (0, 0, 0), (3, 4, 2)), make_placement("B", "C1", (3, 0, 0), (5, 2, 5))]
+    space_matrix = optimizer.get_container_space_matrix(container, placements)
+    prefix_sums = optimizer.get_container_prefix_sums(container, placements)
+    extreme_points = optimizer.get_container_extreme_points(container, placements)
+    
+    positions = optimizer.find_extreme_point_positions(space_matrix, extreme_points, 2, 2, 2, prefix_sums)
+    scan_positions = {position for _, position in optimizer.iter_positions_best_first(prefix_sums, 2, 2, 2)}
+    
+    assert positions
+    assert set(positions) <= scan_positions
+    assert positions == sorted(positions, key=lambda pos: (pos[1], pos[2], pos[0]))
+
+
+def test_extreme_point_placements_never_overlap():
+    container = Container(id="C1", zone="Lab", width=10, depth=10, height=10)
+    items = [make_item(f"I{i}", 2 + i % 3, 3, 2 + i % 4) for i in range(15)]
+    
+    result = SpaceOptimizer(search_strategy="extreme_point").optimize_placement_for_items(items, [container], {})
+    
+    boxes = placed_boxes(result)
+    assert len(boxes) > 1
+    assert not any(boxes_overlap(a, b) for i, a in enumerate(boxes) for b in boxes[i + 1:])
+
+
+def test_extreme_points_project_onto_the_nearest_surface():
+    optimizer = SpaceOptimizer(search_strategy="extreme_point")
+    container = Container(id="C1", zone="Lab", width=6, depth=6, height=6)
+    # The right corner of the top box hangs above the slab, so it drops onto the slab, not the floor
+    placements = [
+        make_placement("A", "C1", (0, 0, 0), (2, 2, 3)),
+        make_placement("B", "C1", (2, 0, 0), (4, 4, 1)),
+        make_placement("C", "C1", (0, 0, 3), (3, 1, 4))
+    ]
+    
+    extreme_points = optimizer.get_container_extreme_points(container, placements)
+    
+    assert (3, 0, 1) in extreme_points
+
+
+def test_extreme_point_search_falls_back_to_every_position():
+    container = Container(id="C1", zone="Lab", width=4, depth=4, height=4)
+    # The only slot for a 4x1x4 item is at the front, and no corner leads to it
+    placements = [
+        make_placement("A", "C1", (0, 0, 0), (1, 1, 3)),
+        make_placement("B", "C1", (1, 0, 0), (3, 1, 3)),
+        make_placement("C", "C1", (3, 0, 0), (4, 2, 1)),
+        make_placement("D", "C1", (2, 1, 1), (4, 3, 4))
+    ]
+    item = make_item("N", 4, 1, 4)
+    optimizer = SpaceOptimizer(search_strategy="extreme_point")
+    
+    placement = optimizer.find_placement_for_item(item, container, placements)
+    
+    assert placement == SpaceOptimizer(search_strategy="scan").find_placement_for_item(item, container, placements)
+    assert placement["startCoordinates"] == {"width": 0, "depth": 3, "height": 0}
+    assert not optimizer.container_infeasible_dims["C1"]
+
+
+def test_recorded_placements_patch_the_cached_grid():
+    optimizer = SpaceOptimizer()
+    container = Container(id="C1", zone="Lab", width=6, depth=6, height=6)
+    placements = [make_placement("A", "C1", (0, 0, 0), (2, 2, 2))]
+    space_matrix = optimizer.get_container_space_matrix(container, placements)
+    optimizer.get_container_prefix_sums(container, placements)
+    
+    position = optimizer.find_placement_for_item(make_item("B", 3, 2, 2), container, placements)
+    recorded = optimizer.record_placement(container, placements, "B", position)
+    
+    # Still the same cached objects, now matching a rebuild from the placement list
+    assert optimizer.get_container_space_matrix(container, placements) is space_matrix
+    rebuilt = SpaceOptimizer()
+    assert np.array_equal(space_matrix, rebuilt.get_container_space_matrix(container, placements))
+    assert np.array_equal(
+        optimizer.get_container_prefix_sums(container, placements),
+        rebuilt.get_container_prefix_sums(container, placements)
+    )
+    
+    optimizer.release_placement(container, placements, recorded)
+    assert int(space_matrix.sum()) == 8
+
+
+def test_packed_backend_matches_dense():
+    containers = [Container(id=f"C{i}", zone="Lab", width=6, depth=6, height=6) for i in range(5)]
+    items = [make_item(f"I{i}", 2 + i % 3, 3, 2 + i % 2) for i in range(40)]
+    
+    dense = SpaceOptimizer().optimize_placement_for_items(items, containers, {})
+    packed_optimizer = SpaceOptimizer(occupancy_backend="packed", working_set_size=2)
+    packed = packed_optimizer.optimize_placement_for_items(items, containers, {})
+    
+    assert packed["placements"] == dense["placements"]
+    assert len(packed_optimizer.container_spaces) <= 2
+    assert packed_optimizer.packed_container_spaces
+    assert packed["stats"]["cacheBytes"] < dense["stats"]["cacheBytes"]
+
+
+def test_pack_round_trip():
+    optimizer = SpaceOptimizer()
+    space_matrix = random_matrix(2)
+    
+    packed = optimizer.pack_space_matrix(space_matrix)
+    
+    assert packed.nbytes * 8 >= space_matrix.size > (packed.nbytes - 1) * 8
+    assert np.array_equal(optimizer.unpack_space_matrix(packed, space_matrix.shape), space_matrix)
+
+
+def test_vectorized_scoring_matches_scan():
+    containers = [Container(id=f"C{i}", zone="Lab", width=8, depth=8, height=8) for i in range(2)]
+    items = [make_item(f"I{i}", 2 + i % 4, 2 + i % 3, 3) for i in range(25)]
+    
+    scan = SpaceOptimizer().optimize_placement_for_items(items, containers, {})
+    vectorized = SpaceOptimizer(search_strategy="vectorized").optimize_placement_for_items(items, containers, {})
+    
+    assert vectorized["placements"] == scan["placements"]
+
+
+def test_branch_and_bound_finds_the_best_scored_position():
+    optimizer = SpaceOptimizer()
+    container = Container(id="C1", zone="Lab", width=7, depth=7, height=7)
+    placements = [
+        make_placement("A", "C1", (0, 0, 0), (4, 2, 3)),
+        make_placement("B", "C1", (4, 0, 0), (7, 5, 2)),
+        make_placement("C", "C1", (0, 2, 0), (3, 6, 6))
+    ]
+    item = make_item("N", 2, 3, 2)
+    space_matrix = optimizer.get_container_space_matrix(container, placements)
+    prefix_sums = optimizer.get_container_prefix_sums(container, placements)
+    
+    # Exhaustive minimum of the accessibility score over every orientation and valid position
+    best_score = min(
+        optimizer.calculate_accessibility_score(space_matrix, w, d, h, w + width, d + depth, h + height, prefix_sums)
+        for width, depth, height in (o["dimensions"] for o in optimizer.get_possible_orientations(item))
+        for _, (w, d, h) in optimizer.iter_positions_best_first(prefix_sums, width, depth, height)
+    )
+    
+    box = position_box(optimizer.find_placement_for_item(item, container, placements))
+    assert optimizer.calculate_accessibility_score(space_matrix, *box, prefix_sums) == best_score
+
+
+def test_capacity_checks_do_not_unpack_containers():
+    optimizer = SpaceOptimizer(occupancy_backend="packed", working_set_size=1)
+    containers = [Container(id=f"C{i}", zone="Lab", width=5, depth=5, height=5) for i in range(3)]
+    existing = {"C0": [make_placement("A", "C0", (0, 0, 0), (5, 5, 3))], "C1": [], "C2": []}
+    for container in containers:
+        optimizer.get_container_summary(container, existing[container.id])
+    assert set(optimizer.packed_container_spaces) == {"C0", "C1"}
+    
+    # Neither check materializes the packed containers
+    assert not optimizer.can_possibly_fit(make_item("Big", 5, 5, 3), containers[0], existing["C0"])
+    assert optimizer.can_possibly_fit(make_item("Small", 2, 2, 2), containers[1], existing["C1"])
+    assert set(optimizer.packed_container_spaces) == {"C0", "C1"}
+    assert optimizer.get_container_summary(containers[0], existing["C0"])["free_volume"] == 50
+    
+    # A changed placement list invalidates the summary
+    existing["C0"].append(make_placement("B", "C0", (0, 0, 3), (5, 5, 5)))
+    assert optimizer.get_container_summary(containers[0], existing["C0"])["free_volume"] == 0
+
+
+def test_capacity_index_rejects_items_larger_than_any_free_run():
+    optimizer = SpaceOptimizer()
+    container = Container(id="C1", zone="Lab", width=6, depth=6, height=6)
+    # A wall down the middle leaves two 2-wide gaps, 24 free cells each
+    placements = [make_placement("Wall", "C1", (2, 0, 0), (4, 6, 6))]
+    
+    assert not optimizer.can_possibly_fit(make_item("Cube", 3, 3, 3), container, placements)
+    assert optimizer.can_possibly_fit(make_item("Narrow", 1, 2, 6), container, placements)
+
+
+def test_duplicate_orientations_are_pruned():
+    optimizer = SpaceOptimizer()
+    
+    assert len(optimizer.get_possible_orientations(make_item("Cube", 2, 2, 2))) == 1
+    assert len(optimizer.get_possible_orientations(make_item("Bar", 1, 1, 3))) == 3
+    assert len(optimizer.get_possible_orientations(make_item("Box", 1, 2, 3))) == 6
+    assert optimizer.get_possible_orientations(make_item("Float", 1.2, 2.0, 2.5))[0]["dimensions"] == (2, 2, 3)
+
+
+def test_infeasible_orientations_are_remembered_until_space_is_freed():
+    optimizer = SpaceOptimizer()
+    container = Container(id="C1", zone="Lab", width=4, depth=4, height=4)
+    blocker = make_placement("A", "C1", (1, 1, 0), (3, 3, 4))
+    placements = [blocker]
+    
+    assert optimizer.find_placement_for_item(make_item("Cube", 3, 3, 3), container, placements) is None
+    assert (3, 3, 3) in optimizer.container_infeasible_dims["C1"]
+    
+    optimizer.release_placement(container, placements, blocker)
+    assert optimizer.find_placement_for_item(make_item("Cube", 3, 3, 3), container, placements) is not None
+
+
+def test_deadline_leaves_items_unplaced():
+    container = Container(id="C1", zone="Lab", width=6, depth=6, height=6)
+    items = [make_item(f"I{i}", 2, 2, 2) for i in range(3)]
+    
+    expired = SpaceOptimizer().optimize_placement_for_items(items, [container], {}, deadline=time.monotonic() - 1)
+    generous = SpaceOptimizer().optimize_placement_for_items(items, [container], {}, deadline=time.monotonic() + 60)
+    
+    assert expired["deadlineExceeded"] is True
+    assert {u["reason"] for u in expired["unplacedItems"]} == {"deadline_exceeded"}
+    assert generous["deadlineExceeded"] is False
+    assert len(generous["placements"]) == 3
+
+
+def test_accessibility_score_from_prefix_sums_matches_slab_sum():
+    optimizer = SpaceOptimizer()
+    space_matrix = random_matrix(2)
+    prefix_sums = optimizer.compute_prefix_sums(space_matrix)
+    
+    for box in [(0, 3, 0, 2, 5, 2), (1, 1, 4, 5, 6, 7), (2, 5, 2, 3, 6, 6), (0, 0, 0, 5, 2, 3)]:
+        expected = optimizer.calculate_accessibility_score(space_matrix, *box)
+        assert optimizer.calculate_accessibility_score(space_matrix, *box, prefix_sums=prefix_sums) == expected
+
+
+def test_items_in_front_raise_the_accessibility_score():
+    optimizer = SpaceOptimizer()
+    space_matrix = np.zeros((4, 4, 4), dtype=np.int8)
+    space_matrix[0:2, 0:1, 0:2] = 1
+    prefix_sums = optimizer.compute_prefix_sums(space_matrix)
+    
+    blocked = optimizer.calculate_accessibility_score(space_matrix, 0, 2, 0, 2, 3, 2, prefix_sums=prefix_sums)
+    clear = optimizer.calculate_accessibility_score(space_matrix, 2, 2, 0, 4, 3, 2, prefix_sums=prefix_sums)
+    
+    assert clear == 4.0
+    assert blocked == 4.0 + 4 * 10.0
+
+
+def two_slot_rearrangement():
+    lab = Container(id="C1", zone="Lab", width=4, depth=4, height=4)
+    spare = Container(id="C2", zone="Storage", width=4, depth=4, height=4)
+    low_items = [make_item("L1", 2, 4, 4, priority=1), make_item("L2", 2, 4, 4, priority=2)]
+    new_item = make_item("N", 4, 4, 4, priority=90)
+    existing = {
+        "C1": [make_placement("L1", "C1", (0, 0, 0), (2, 4, 4)), make_placement("L2", "C1", (2, 0, 0), (4, 4, 4))],
+        "C2": []
+    }
+    return new_item, [lab, spare], existing, low_items + [new_item]
+
+
+def test_rearrangement_can_evict_several_items():
+    new_item, containers, existing, items = two_slot_rearrangement()
+    
+    result = SpaceOptimizer().attempt_rearrangement(new_item, containers, existing, 1, items)
+    
+    assert result["placement"]["containerId"] == "C1"
+    assert [(s["action"], s["itemId"]) for s in result["steps"]] == [
+        ("remove", "L1"), ("remove", "L2"), ("place", "L1"), ("place", "L2"), ("place", "N")
+    ]
+    moved = [position_box(s["toPosition"]) for s in result["steps"] if s["itemId"] != "N" and s["action"] == "place"]
+    assert not boxes_overlap(*moved)
+    assert [step["step"] for step in result["steps"]] == [1, 2, 3, 4, 5]
+
+
+def test_rearrangement_respects_the_eviction_set_size():
+    new_item, containers, existing, items = two_slot_rearrangement()
+    
+    assert SpaceOptimizer(max_eviction_set_size=1).attempt_rearrangement(new_item, containers, existing, 1, items) is None
+
+
+def test_rearrangement_stops_at_the_node_budget():
+    # Evicting L1 frees enough volume but not a contiguous slot; only evicting L2 works
+    lab = Container(id="C1", zone="Lab", width=5, depth=4, height=4)
+    spare = Container(id="C2", zone="Storage", width=4, depth=4, height=4)
+    items = [make_item("L1", 2, 4, 4, priority=1), make_item("L2", 2, 4, 4, priority=2), make_item("N", 3, 4, 4, priority=90)]
+    existing = {
+        "C1": [make_placement("L1", "C1", (3, 0, 0), (5, 4, 4)), make_placement("L2", "C1", (1, 0, 0), (3, 4, 4))],
+        "C2": []
+    }
+    
+    assert SpaceOptimizer(rearrangement_node_budget=1).attempt_rearrangement(items[2], [lab, spare], existing, 1, items) is None
+    result = SpaceOptimizer(rearrangement_node_budget=2).attempt_rearrangement(items[2], [lab, spare], existing, 1, items)
+    assert [(s["action"], s["itemId"]) for s in result["steps"]] == [("remove", "L2"), ("place", "L2"), ("place", "N")]
+
+
+def test_searches_wait_while_the_cached_grid_is_patched(monkeypatch):
+    optimizer = SpaceOptimizer()
+    container = Container(id="C1", zone="Lab", width=4, depth=4, height=4)
+    placements = [make_placement("A", "C1", (0, 0, 0), (4, 4, 4))]
+    results = []
+    other = threading.Thread(
+        target=lambda: results.append(optimizer.find_placement_for_item(make_item("B", 1, 1, 1), container, placements))
+    )
+    search = optimizer.search_container_space
+    
+    def search_while_patched(*args, **kwargs):
+        # The grid has A's box freed here; a concurrent search must not see it
+        if threading.current_thread() is not other:
+            other.start()
+            other.join(timeout=0.2)
+            assert other.is_alive()
+        return search(*args, **kwargs)
+    
+    monkeypatch.setattr(optimizer, "search_container_space", search_while_patched)
+    optimizer.find_placement_with_changes(
+        make_item("N", 4, 4, 4), container, placements, removed_boxes=[(0, 0, 0, 4, 4, 4)]
+    )
+    other.join()
+    
+    assert results == [None]
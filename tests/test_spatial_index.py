@@ -0,0 +1,88 @@
+import random
+
+from utils.spatial_index import ContainerSpatialIndex
+from tests.helpers import make_placement
+
+
+def random_placements(seed, count=40):
+    rng = random.Random(seed)
+    placements = []
+    for placement_id in range(1, count + 1):
+        start = (rng.randint(0, 30), rng.randint(0, 30), rng.randint(0, 30))
+        end = tuple(s + rng.randint(1, 12) for s in start)
+        placement = make_placement(f"I{placement_id}", "C1", start, end)
+        placement.id = placement_id
+        placements.append(placement)
+    return placements
+
+
+def brute_force_blockers(target, placements):
+    return {
+        p.id for p in placements
+        if p.id != target.id and p.end_depth <= target.start_depth
+        and p.start_width < target.end_width and p.end_width > target.start_width
+        and p.start_height < target.end_height and p.end_height > target.start_height
+    }
+
+
+def test_blocking_placements_match_brute_force():
+    placements = random_placements(0)
+    index = ContainerSpatialIndex("C1", cell_size=8)
+    index.sync(placements)
+    
+    for target in placements:
+        found = [p.id for p in index.find_blocking_placements(target)]
+        assert len(found) == len(set(found))
+        assert set(found) == brute_force_blockers(target, placements)
+
+
+def test_sync_reindexes_moved_and_removed_placements():
+    placements = random_placements(1)
+    index = ContainerSpatialIndex("C1", cell_size=8)
+    index.sync(placements)
+    
+    moved = placements[0]
+    moved.start_depth, moved.end_depth = 0, 1
+    remaining = placements[:20]
+    index.sync(remaining)
+    
+    rebuilt = ContainerSpatialIndex("C1", cell_size=8)
+    rebuilt.sync(remaining)
+    assert index.version == rebuilt.version
+    for target in remaining:
+        assert {p.id for p in index.find_blocking_placements(target)} == brute_force_blockers(target, remaining)
+
+
+def test_retrieval_set_is_transitive_and_front_to_back():
+    front = make_placement("A", "C1", (0, 0, 0), (4, 2, 4))
+    middle = make_placement("B", "C1", (2, 2, 0), (6, 4, 4))
+    back = make_placement("C", "C1", (4, 4, 0), (8, 6, 4))
+    aside = make_placement("D", "C1", (10, 0, 0), (12, 2, 4))
+    for placement_id, placement in enumerate((front, middle, back, aside), start=1):
+        placement.id = placement_id
+    index = ContainerSpatialIndex("C1", cell_size=4)
+    index.sync([back, aside, middle, front])
+    
+    # A only overlaps B's footprint, so it blocks C through B
+    assert [p.item_id for p in index.get_retrieval_set(back)] == ["A", "B"]
+    assert [p.item_id for p in index.get_retrieval_set(middle)] == ["A"]
+    
+    index.sync([back, aside, front])
+    assert index.get_retrieval_set(back) == []
+
+
+def test_cached_blockers_follow_placements_added_in_front():
+    back = make_placement("B", "C1", (0, 4, 0), (4, 6, 4))
+    back.id = 1
+    index = ContainerSpatialIndex("C1", cell_size=4)
+    index.sync([back])
+    assert index.get_direct_blockers(1) == []
+    
+    front = make_placement("F", "C1", (2, 0, 2), (6, 3, 6))
+    front.id = 2
+    index.sync([back, front])
+    assert index.get_direct_blockers(1) == [2]
+    
+    front.start_width, front.end_width = 4, 8
+    index.sync([back, front])
+    assert index.get_direct_blockers(1) == []
@@ -0,0 +1,33 @@
+from datetime import datetime, timedelta
+
+from utils.station_simulator import StationSimulator
+from tests.helpers import make_item
+
+
+def test_uses_are_applied_before_the_days_expiries():
+    start = datetime(2030, 1, 1)
+    food = make_item("F", 1, 1, 1, priority=10)
+    food.usage_limit = food.remaining_uses = 2
+    food.expiry_date = start + timedelta(days=1, hours=6)  # Expires on day 2
+    water = make_item("W", 1, 1, 1, priority=90)
+    water.expiry_date = start + timedelta(days=2)  # Expires at the end of day 2
+    
+    result = StationSimulator().run([food, water], 3, usage_schedule={2: ["F", "F"]}, start_date=start)
+    
+    assert [(e["day"], e["usedUpItems"], e["expiredItems"]) for e in result["events"]] == [(2, ["F"], ["W"])]
+    assert result["totals"]["newWasteItems"] == 2
+    assert result["finalState"]["remainingUses"] == {"F": 0}
+
+
+def test_waste_cannot_be_used_and_schedule_days_are_bounded():
+    start = datetime(2030, 1, 1)
+    spent = make_item("S", 1, 1, 1)
+    spent.is_waste = True
+    simulator = StationSimulator(max_days=10)
+    
+    result = simulator.run([spent], 2, daily_usage=["S", "Y"], start_date=start)
+    assert result["totals"]["ignoredUses"] == 2
+    assert result["unknownItems"] == ["Y"]
+    
+    assert simulator.run([spent], 2, usage_schedule={3: ["S"]})["success"] is False
+    assert simulator.run([spent], 11)["success"] is False
@@ -0,0 +1,143 @@
+import itertools
+import random
+
+import pytest
+
+from models import Container
+from utils.space_optimizer import SpaceOptimizer
+from utils.waste_manager import WasteManager
+from tests.helpers import make_item, make_placement, boxes_overlap, position_box
+
+
+def waste_item(item_id, mass, size):
+    item = make_item(item_id, size, size, size)
+    item.mass = mass
+    item.is_waste = True
+    return item
+
+
+def test_disposal_selection_matches_brute_force():
+    rng = random.Random(0)
+    manager = WasteManager()
+    for _ in range(20):
+        candidates = [waste_item(f"W{i}", rng.randint(1, 40) / 2, rng.randint(1, 4)) for i in range(8)]
+        mass_limit, volume_limit = rng.randint(5, 60), rng.randint(20, 120)
+        
+        selected, stats = manager.select_disposal_items(candidates, mass_limit, volume_limit)
+        
+        best = max(
+            sum(item.mass for item in subset)
+            for size in range(len(candidates) + 1) for subset in itertools.combinations(candidates, size)
+            if sum(item.mass for item in subset) <= mass_limit and
+            sum(item.width * item.depth * item.height for item in subset) <= volume_limit
+        )
+        assert sum(item.mass for item in selected) == pytest.approx(best)
+        assert sum(item.width * item.depth * item.height for item in selected) <= volume_limit
+        assert 0.0 <= stats["optimalityGap"] <= 1.0
+
+
+def test_massless_waste_fills_the_volume_left():
+    manager = WasteManager()
+    heavy = waste_item("H", 10.0, 2)
+    small, large = waste_item("S", 0.0, 1), waste_item("L", 0.0, 3)
+    
+    selected, _ = manager.select_disposal_items([heavy, large, small], 10.0, 9)
+    assert [item.id for item in selected] == ["H", "S"]
+    
+    selected, _ = manager.select_disposal_items([small, large], 0.0, 100)
+    assert {item.id for item in selected} == {"S", "L"}
+
+
+@pytest.mark.parametrize("mass_limit", [float('inf'), 5.25])
+def test_masses_off_the_resolution_still_fill_the_limit(mass_limit):
+    # 1.05 kg rounds up to 1.1 kg, so five items only fit the rounded limit four times
+    manager = WasteManager()
+    candidates = [waste_item(f"W{i}", 1.05, 1) for i in range(5)]
+    
+    selected, stats = manager.select_disposal_items(candidates, mass_limit, 100)
+    
+    assert len(selected) == 5
+    assert stats["optimalityGap"] == 0.0
+
+
+def test_without_a_weight_limit_only_the_volume_limits_the_load():
+    rng = random.Random(1)
+    manager = WasteManager()
+    candidates = [waste_item(f"W{i}", rng.randint(1, 500) / 100, rng.randint(1, 4)) for i in range(10)]
+    volume_limit = 60
+    
+    selected, _ = manager.select_disposal_items(candidates, float('inf'), volume_limit)
+    
+    best = max(
+        sum(item.mass for item in subset)
+        for size in range(len(candidates) + 1) for subset in itertools.combinations(candidates, size)
+        if sum(item.width * item.depth * item.height for item in subset) <= volume_limit
+    )
+    assert sum(item.mass for item in selected) == pytest.approx(best)
+    assert sum(item.width * item.depth * item.height for item in selected) <= volume_limit
+
+
+def test_disposal_plan_without_a_weight_limit_loads_every_item_that_fits():
+    source = Container(id="C1", zone="Lab", width=5, depth=1, height=1)
+    undocking = Container(id="U1", zone="Airlock", width=5, depth=1, height=1)
+    wastes = [waste_item(f"W{i}", 1.05, 1) for i in range(5)]
+    placements = [make_placement(f"W{i}", "C1", (i, 0, 0), (i + 1, 1, 1)) for i in range(5)]
+    
+    plan = WasteManager(SpaceOptimizer()).plan_waste_disposal(wastes, undocking, placements, weight_limit=None)
+    
+    assert plan["totalItems"] == 5
+    assert plan["totalMass"] == pytest.approx(5.25)
+    assert plan["remainingCapacity"] is None
+    assert plan["optimalityGap"] == 0.0
+
+
+def test_disposal_plan_packs_waste_in_real_positions_and_moves_blockers_once():
+    source = Container(id="C1", zone="Lab", width=4, depth=4, height=4)
+    undocking = Container(id="U1", zone="Airlock", width=4, depth=4, height=4)
+    blocker = make_item("B", 4, 2, 2)
+    wastes = [waste_item("W1", 1.0, 2), waste_item("W2", 1.0, 2)]
+    stowed = make_item("E", 4, 4, 2)
+    placements = [
+        make_placement("B", "C1", (0, 0, 0), (4, 2, 2)),
+        make_placement("W1", "C1", (0, 2, 0), (2, 4, 2)),
+        make_placement("W2", "C1", (2, 2, 0), (4, 4, 2)),
+        make_placement("E", "U1", (0, 0, 0), (4, 4, 2))
+    ]
+    for placement_id, placement in enumerate(placements, start=1):
+        placement.id = placement_id
+    optimizer = SpaceOptimizer()
+    manager = WasteManager(optimizer)
+    
+    plan = manager.plan_waste_disposal(
+        wastes, undocking, placements, containers=[source, undocking], items=[blocker, stowed] + wastes
+    )
+    
+    steps = [(s["action"], s["itemId"], s.get("fromContainer") or s.get("toContainer")) for s in plan["disposalSteps"]]
+    assert steps == [
+        ("remove", "B", "C1"), ("remove", "W1", "C1"), ("remove", "W2", "C1"), ("place", "B", "C1"),
+        ("place", "W1", "U1"), ("place", "W2", "U1")
+    ]
+    boxes = [position_box(s["toPosition"]) for s in plan["disposalSteps"] if s.get("toContainer") == "U1"] + \
+        [(0, 0, 0, 4, 4, 2)]
+    assert not any(boxes_overlap(a, b) for i, a in enumerate(boxes) for b in boxes[i + 1:])
+    
+    # The plan is not stowed, so the cached grid still holds only what is really there
+    undocking_placements = [p for p in placements if p.container_id == "U1"]
+    cached = optimizer.get_container_space_matrix(undocking, undocking_placements)
+    assert cached.sum() == 4 * 4 * 2
+
+
+def test_waste_is_loaded_back_to_front():
+    source = Container(id="C1", zone="Lab", width=4, depth=2, height=2)
+    undocking = Container(id="U1", zone="Airlock", width=2, depth=4, height=2)
+    # The heavier item comes out first, but the first position planned is at the open face
+    wastes = [waste_item("W0", 2.0, 2), waste_item("W1", 1.0, 2)]
+    placements = [make_placement("W0", "C1", (0, 0, 0), (2, 2, 2)), make_placement("W1", "C1", (2, 0, 0), (4, 2, 2))]
+    
+    plan = WasteManager(SpaceOptimizer()).plan_waste_disposal(wastes, undocking, placements)
+    
+    loads = [s for s in plan["disposalSteps"] if s.get("toContainer") == "U1"]
+    depths = [s["toPosition"]["startCoordinates"]["depth"] for s in loads]
+    assert len(loads) == 2
+    assert depths == sorted(depths, reverse=True)
+    assert [s["action"] for s in plan["disposalSteps"]] == ["remove", "remove", "place", "place"]
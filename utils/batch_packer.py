@@ -0,0 +1,115 @@
+import time
+from typing import List, Dict, Tuple, Optional
+import logging
+from models import Item, Container, ItemPlacement
+from utils.space_optimizer import SpaceOptimizer
+
+logger = logging.getLogger(__name__)
+
+class BatchPacker:
+    """
+    Class responsible for packing a whole manifest across all containers at once,
+    as an alternative to the item-by-item greedy loop of SpaceOptimizer
+    """
+    
+    def __init__(self, space_optimizer: SpaceOptimizer, priority_tier_size: int = 25):
+        # Positions are searched with the optimizer's strategy and caches, so
+        # both packing modes share the same occupancy grids
+        self.space_optimizer = space_optimizer
+        self.priority_tier_size = max(1, priority_tier_size)
+    
+    def get_priority_tier(self, item: Item) -> int:
+        """Bucket an item's priority (0-100) into a tier; higher tiers are packed first"""
+        return item.priority // self.priority_tier_size
+    
+    def sort_manifest(self, items: List[Item]) -> List[Item]:
+        """
+        First-fit-decreasing order: priority tiers from highest to lowest, and
+        within a tier the largest items first so the small ones fill the gaps
+        """
+        return sorted(
+            items,
+            key=lambda x: (-self.get_priority_tier(x), -(x.width * x.depth * x.height), -x.priority, x.id)
+        )
+    
+    def get_item_signature(self, item: Item) -> Tuple:
+        """Items with the same signature fit exactly where each other fit"""
+        return (tuple(sorted((item.width, item.depth, item.height))), item.preferred_zone)
+    
+    def pack_manifest(self, items: List[Item], containers: List[Container],
+                      existing_placements: Dict[str, List[ItemPlacement]],
+                      deadline: Optional[float] = None) -> Dict:
+        """
+        Pack all items with first-fit-decreasing by volume within priority tiers.
+        Nothing already stowed is moved, so no rearrangements are produced.
+        Returns the same result shape as SpaceOptimizer.optimize_placement_for_items
+        """
+        with self.space_optimizer.lock:
+            logger.info(f"Batch packing {len(items)} items across {len(containers)} containers")
+            started_at = time.perf_counter()
+            optimizer = self.space_optimizer
+            
+            sorted_items = self.sort_manifest(items)
+            stats_before = dict(optimizer.orientation_stats)
+            
+            existing_placements = {
+                container_id: list(container_placements)
+                for container_id, container_placements in existing_placements.items()
+            }
+            zone_index = optimizer.build_zone_index(containers)
+            
+            placements = []
+            unplaced_items = []
+            # Containers only fill up during a batch, so once an item fits nowhere
+            # every later item of the same size and zone can skip the search
+            unplaceable_signatures = set()
+            skipped_searches = 0
+            
+            for item in sorted_items:
+                if optimizer.deadline_passed(deadline):
+                    unplaced_items.append({"itemId": item.id, "reason": "deadline_exceeded"})
+                    continue
+                
+                signature = self.get_item_signature(item)
+                if signature in unplaceable_signatures:
+                    skipped_searches += 1
+                    unplaced_items.append({"itemId": item.id, "reason": "no_space"})
+                    continue
+                
+                preferred_containers, other_containers = zone_index.get(item.preferred_zone, ([], containers))
+                container, placement = optimizer.find_first_placement(
+                    item, preferred_containers, existing_placements, deadline
+                )
+                if not placement:
+                    container, placement = optimizer.find_first_placement(
+                        item, other_containers, existing_placements, deadline
+                    )
+                
+                if placement:
+                    placements.append({
+                        "itemId": item.id,
+                        "containerId": container.id,
+                        "position": placement
+                    })
+                    optimizer.record_placement(container, existing_placements[container.id], item.id, placement)
+                elif optimizer.deadline_passed(deadline):
+                    unplaced_items.append({"itemId": item.id, "reason": "deadline_exceeded"})
+                else:
+                    unplaceable_signatures.add(signature)
+                    unplaced_items.append({"itemId": item.id, "reason": "no_space"})
+            
+            optimizer.log_orientation_stats(stats_before)
+            
+            stats = optimizer.get_utilization_stats(containers, existing_placements)
+            stats["itemsPlaced"] = len(placements)
+            stats["skippedSearches"] = skipped_searches
+            stats["runtimeMs"] = round((time.perf_counter() - started_at) * 1000, 2)
+            
+            return {
+                "success": len(placements) == len(sorted_items),
+                "placements": placements,
+                "rearrangements": [],
+                "unplacedItems": unplaced_items,
+                "deadlineExceeded": any(u["reason"] == "deadline_exceeded" for u in unplaced_items),
+                "stats": stats
+            }
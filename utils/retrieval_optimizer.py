@@ -3,6 +3,7 @@ import numpy as np
 import logging
 from datetime import datetime
 from models import Item, Container, ItemPlacement
+from utils.spatial_index import ContainerSpatialIndex
 
 logger = logging.getLogger(__name__)
 
@@ -12,94 +13,308 @@ class RetrievalOptimizer:
     based on priority, accessibility, and expiry dates
     """
     
-    def __init__(self):
-        pass
+    def __init__(self, index_cell_size: float = 10.0):
+        self.index_cell_size = index_cell_size
+        self.container_indexes = {}  # Spatial index of the placements per container
+        self.retrieval_costs = {}  # Container id -> (index version, {placement id: (blocking count, blocker mass)})
+    
+    def reset_container_index(self, container_id: str):
+        """Remove a container's spatial index and retrieval costs to force a rebuild"""
+        if container_id in self.container_indexes:
+            del self.container_indexes[container_id]
+        self.invalidate_retrieval_costs(container_id)
+    
+    def invalidate_retrieval_costs(self, container_id: str):
+        """Drop the cached retrieval costs of a container after its contents changed"""
+        if container_id in self.retrieval_costs:
+            del self.retrieval_costs[container_id]
+    
+    def get_retrieval_costs(self, container_id: str, spatial_index: ContainerSpatialIndex) -> Dict:
+        """
+        Create or retrieve the retrieval cost cache of a container. Costs are
+        also dropped whenever the synced spatial index shows the placements moved
+        """
+        cached = self.retrieval_costs.get(container_id)
+        if cached is None or cached[0] != spatial_index.version:
+            cached = (spatial_index.version, {})
+            self.retrieval_costs[container_id] = cached
+        return cached[1]
+    
+    def get_container_index(self, container: Container,
+                            container_placements: List[ItemPlacement]) -> ContainerSpatialIndex:
+        """
+        Create or retrieve the spatial index of a container, synced with its current placements
+        """
+        if container.id not in self.container_indexes:
+            self.container_indexes[container.id] = ContainerSpatialIndex(container.id, self.index_cell_size)
+        
+        spatial_index = self.container_indexes[container.id]
+        spatial_index.sync(container_placements)
+        return spatial_index
     
     def find_optimal_item_to_retrieve(self, item_name: str, items: List[Item], 
                                      containers: List[Container],
-                                     placements: List[ItemPlacement]) -> Optional[Dict]:
+                                     placements: List[ItemPlacement],
+                                     matching_item_ids: Optional[List[str]] = None) -> Optional[Dict]:
         """
         Find the optimal item to retrieve based on name search
-        Returns the item and retrieval instructions
+        Returns the item and retrieval instructions.
+        matching_item_ids, when given, are the ranked results of a name index
+        lookup for item_name and replace the scan of every item name.
+        Only the containers holding a match and all placements in those
+        containers are needed, not the whole station inventory
         """
         logger.info(f"Finding optimal item to retrieve: {item_name}")
         
+        # Index the inputs once, everything below is a dict lookup
+        inventory = self.index_inventory(items, containers, placements)
+        items_by_id = inventory["items"]
+        
         # Find all matching items by name
-        matching_items = [item for item in items if item_name.lower() in item.name.lower() and not item.is_waste]
+        if matching_item_ids is not None:
+            matching_items = [
+                items_by_id[item_id] for item_id in matching_item_ids
+                if item_id in items_by_id and not items_by_id[item_id].is_waste
+            ]
+        else:
+            matching_items = [item for item in items if item_name.lower() in item.name.lower() and not item.is_waste]
         
         if not matching_items:
             logger.warning(f"No items found matching: {item_name}")
             return None
         
         # Get all placements for these items
-        item_ids = [item.id for item in matching_items]
-        matching_placements = [p for p in placements if p.item_id in item_ids]
-        
-        if not matching_placements:
+        if not any(item.id in inventory["placements_by_item"] for item in matching_items):
             logger.warning(f"No placements found for items matching: {item_name}")
             return None
         
-        best_item = None
-        best_placement = None
-        best_score = float('inf')
-        retrieval_steps = []
+        best = self.select_best_candidate(matching_items, inventory)
+        if best is None:
+            return None
+        best_item, best_placement = best
+        
+        # Get container for the best placement
+        container = inventory["containers"].get(best_placement.container_id)
+        
+        # Only the winner needs its retrieval steps spelled out
+        _, retrieval_steps = self.calculate_retrieval_complexity(
+            best_item, best_placement, container, inventory["item_list"], inventory["placement_list"],
+            self.get_synced_index(container, inventory), inventory["items"]
+        )
+        
+        return {
+            "item": best_item.to_dict(),
+            "placement": best_placement.to_dict(),
+            "container": container.to_dict() if container else None,
+            "retrievalSteps": retrieval_steps,
+            "stepsRequired": len(retrieval_steps)
+        }
+    
+    def index_inventory(self, items: List[Item], containers: List[Container],
+                        placements: List[ItemPlacement]) -> Dict:
+        """
+        Index items, containers and placements by id once per request. Spatial
+        indexes are synced lazily, once per container, as candidates need them
+        """
+        inventory = {
+            "item_list": items,
+            "placement_list": placements,
+            "items": {item.id: item for item in items},
+            "containers": {container.id: container for container in containers},
+            "placements_by_item": {},
+            "placements_by_container": {},
+            "spatial_indexes": {}
+        }
+        for placement in placements:
+            inventory["placements_by_item"].setdefault(placement.item_id, []).append(placement)
+            inventory["placements_by_container"].setdefault(placement.container_id, []).append(placement)
+        return inventory
+    
+    def get_synced_index(self, container: Container, inventory: Dict) -> ContainerSpatialIndex:
+        """Spatial index of a container, synced with the inventory's placements on first use"""
+        spatial_indexes = inventory["spatial_indexes"]
+        if container.id not in spatial_indexes:
+            spatial_indexes[container.id] = self.get_container_index(
+                container, inventory["placements_by_container"].get(container.id, [])
+            )
+        return spatial_indexes[container.id]
+    
+    def select_best_candidate(self, matching_items: List[Item],
+                              inventory: Dict) -> Optional[Tuple[Item, ItemPlacement]]:
+        """
+        Score every placement of the matching items in one vectorized pass and
+        return the best (item, placement), or None if none of them is placed
+        """
+        candidates = []
+        blocking_counts = []
+        blocker_masses = []
         
         for item in matching_items:
             # Find all placements for this item
-            item_placements = [p for p in placements if p.item_id == item.id]
-            
-            for placement in item_placements:
+            for placement in inventory["placements_by_item"].get(item.id, []):
                 # Find container for this placement
-                container = next((c for c in containers if c.id == placement.container_id), None)
+                container = inventory["containers"].get(placement.container_id)
                 if not container:
                     continue
                 
-                # Calculate retrieval complexity score (lower is better)
-                retrieval_score, steps = self.calculate_retrieval_complexity(
-                    item, placement, container, items, placements
-                )
-                
-                # Add expiry factor - prioritize items closer to expiry
-                expiry_factor = 0
-                if item.expiry_date:
-                    days_until_expiry = (item.expiry_date - datetime.now()).days
-                    if days_until_expiry > 0:
-                        # Prioritize items closer to expiry but not expired
-                        expiry_factor = max(0, 100 - days_until_expiry) * 0.5
-                
-                # Calculate combined score (lower is better)
-                # Weight factors: retrieval complexity, item priority, expiry
-                combined_score = retrieval_score - (item.priority * 0.5) - expiry_factor
+                # Blocking items and their mass, reused from an earlier search
+                # while the container is unchanged
+                spatial_index = self.get_synced_index(container, inventory)
+                retrieval_costs = self.get_retrieval_costs(container.id, spatial_index)
+                if placement.id not in retrieval_costs:
+                    retrieval_costs[placement.id] = self.get_blocking_stats(
+                        placement, container, spatial_index, inventory
+                    )
+                blocking_count, blocker_mass = retrieval_costs[placement.id]
                 
-                if combined_score < best_score:
-                    best_score = combined_score
-                    best_item = item
-                    best_placement = placement
-                    retrieval_steps = steps
+                candidates.append((item, placement))
+                blocking_counts.append(blocking_count)
+                blocker_masses.append(blocker_mass)
         
-        if not best_item or not best_placement:
+        if not candidates:
             return None
         
-        # Get container for the best placement
-        container = next((c for c in containers if c.id == best_placement.container_id), None)
+        priorities = np.array([item.priority for item, _ in candidates], dtype=np.float64)
+        expiry_dates = np.array([item.expiry_date for item, _ in candidates], dtype='datetime64[us]')
+        
+        # Add expiry factor - prioritize items closer to expiry but not expired
+        now = np.datetime64(datetime.now(), 'us')
+        has_expiry = ~np.isnat(expiry_dates)
+        days_until_expiry = (np.where(has_expiry, expiry_dates, now) - now) // np.timedelta64(1, 'D')
+        expiry_factors = np.where(days_until_expiry > 0, np.maximum(0, 100 - days_until_expiry) * 0.5, 0.0)
+        
+        # Calculate combined score (lower is better)
+        # Weight factors: retrieval complexity (items to move and their mass), item priority, expiry
+        retrieval_scores = np.array(blocking_counts, dtype=np.float64) * 10.0 + \
+            np.array(blocker_masses, dtype=np.float64) * 0.5
+        combined_scores = retrieval_scores - priorities * 0.5 - expiry_factors
+        
+        # argmin keeps the first of equal scores, like the ranked candidate order
+        return candidates[int(np.argmin(combined_scores))]
+    
+    def get_blocking_stats(self, placement: ItemPlacement, container: Container,
+                           spatial_index: ContainerSpatialIndex, inventory: Dict) -> Tuple[int, float]:
+        """Number and total mass of the items that have to be moved to retrieve a placement"""
+        if self.is_item_visible(placement, container, None):
+            return 0, 0.0
+        
+        blocking_items = self.find_blocking_items(
+            placement, container, None, inventory["item_list"], spatial_index, inventory["items"]
+        )
+        return len(blocking_items), float(sum(item.mass for _, item in blocking_items))
+    
+    def plan_batch_retrieval(self, candidate_lists: List[List[str]], items: List[Item],
+                             containers: List[Container], placements: List[ItemPlacement]) -> Dict:
+        """
+        Plan several retrievals as one pass over the containers. Each request is a
+        ranked list of candidate item ids (a name index result, or a single id) and
+        gets its best candidate as in find_optimal_item_to_retrieve, never an item
+        already chosen for an earlier request. Within a container every blocking
+        item is removed once and only put back after the last retrieval there
+        """
+        logger.info(f"Planning batch retrieval of {len(candidate_lists)} requests")
+        
+        inventory = self.index_inventory(items, containers, placements)
+        items_by_id = inventory["items"]
+        
+        retrievals = []
+        unresolved = []
+        chosen_item_ids = set()
+        targets_by_container = {}
+        
+        for request_index, candidate_ids in enumerate(candidate_lists):
+            matching_items = [
+                items_by_id[item_id] for item_id in candidate_ids
+                if item_id in items_by_id and not items_by_id[item_id].is_waste and item_id not in chosen_item_ids
+            ]
+            best = self.select_best_candidate(matching_items, inventory)
+            if best is None:
+                unresolved.append(request_index)
+                continue
+            
+            item, placement = best
+            chosen_item_ids.add(item.id)
+            container = inventory["containers"][placement.container_id]
+            targets_by_container.setdefault(container.id, []).append((item, placement))
+            retrievals.append({
+                "request": request_index,
+                "item": item.to_dict(),
+                "placement": placement.to_dict(),
+                "container": container.to_dict()
+            })
+        
+        # Containers are visited in the order their first retrieval was requested
+        steps = []
+        for container_id, targets in targets_by_container.items():
+            steps.extend(self.build_container_retrieval_steps(
+                inventory["containers"][container_id], targets, inventory, len(steps) + 1
+            ))
         
         return {
-            "item": best_item.to_dict(),
-            "placement": best_placement.to_dict(),
-            "container": container.to_dict() if container else None,
-            "retrievalSteps": retrieval_steps,
-            "stepsRequired": len(retrieval_steps)
+            "retrievals": retrievals,
+            "unresolved": unresolved,
+            "retrievalSteps": steps,
+            "stepsRequired": len(steps)
         }
     
+    def build_container_retrieval_steps(self, container: Container, targets: List[Tuple[Item, ItemPlacement]],
+                                        inventory: Dict, first_step: int) -> List[Dict]:
+        """
+        Steps to retrieve several items from one container. Targets are taken
+        front to back, so a target blocking another is retrieved rather than moved,
+        and removed blockers are put back in reverse order once all targets are out
+        """
+        spatial_index = self.get_synced_index(container, inventory)
+        targets = sorted(targets, key=lambda target: target[1].start_depth)
+        target_placement_ids = {placement.id for _, placement in targets}
+        
+        steps = []
+        removed = []
+        removed_ids = set()
+        
+        def add_step(action: str, item: Item, placement: ItemPlacement):
+            steps.append({
+                "step": first_step + len(steps),
+                "action": action,
+                "itemId": item.id,
+                "containerId": container.id,
+                "position": placement.to_dict()["position"]
+            })
+        
+        for target_item, target_placement in targets:
+            blocking_items = self.find_blocking_items(
+                target_placement, container, None, inventory["item_list"], spatial_index, inventory["items"]
+            )
+            for blocking_placement, blocking_item in blocking_items:
+                if blocking_placement.id in target_placement_ids or blocking_placement.id in removed_ids:
+                    continue
+                add_step("remove", blocking_item, blocking_placement)
+                removed.append((blocking_placement, blocking_item))
+                removed_ids.add(blocking_placement.id)
+            
+            add_step("retrieve", target_item, target_placement)
+        
+        # Steps to put back blocking items
+        for blocking_placement, blocking_item in reversed(removed):
+            add_step("place", blocking_item, blocking_placement)
+        
+        return steps
+    
     def calculate_retrieval_complexity(self, target_item: Item, target_placement: ItemPlacement,
                                      container: Container, all_items: List[Item],
-                                     all_placements: List[ItemPlacement]) -> Tuple[float, List[Dict]]:
+                                     all_placements: List[ItemPlacement],
+                                     spatial_index: Optional[ContainerSpatialIndex] = None,
+                                     items_by_id: Optional[Dict[str, Item]] = None) -> Tuple[float, List[Dict]]:
         """
         Calculate how complex it is to retrieve an item
-        Returns a complexity score and the steps needed
+        Returns a complexity score and the steps needed.
+        A spatial index already synced with the container and the items
+        indexed by id can be passed in to skip rebuilding them
         """
-        # Get all placements in this container
-        container_placements = [p for p in all_placements if p.container_id == container.id]
+        # Get all placements in this container, unless the synced index already holds them
+        container_placements = None
+        if spatial_index is None:
+            container_placements = [p for p in all_placements if p.container_id == container.id]
         
         # Check if the item is directly accessible (visible from open face)
         is_visible = self.is_item_visible(target_placement, container, container_placements)
@@ -110,7 +325,7 @@ class RetrievalOptimizer:
         
         # Item is blocked, need to identify blocking items
         blocking_items = self.find_blocking_items(
-            target_placement, container, container_placements, all_items
+            target_placement, container, container_placements, all_items, spatial_index, items_by_id
         )
         
         # Generate steps for retrieval
@@ -167,41 +382,30 @@ class RetrievalOptimizer:
         return placement.start_depth == 0
     
     def find_blocking_items(self, target_placement: ItemPlacement, container: Container,
-                          container_placements: List[ItemPlacement], all_items: List[Item]) -> List[Tuple]:
+                          container_placements: Optional[List[ItemPlacement]], all_items: List[Item],
+                          spatial_index: Optional[ContainerSpatialIndex] = None,
+                          items_by_id: Optional[Dict[str, Item]] = None) -> List[Tuple]:
         """
         Find items that block access to the target item
-        Returns list of (placement, item) tuples sorted by retrieval order
+        Returns list of (placement, item) tuples sorted by retrieval order.
+        Blocking placements are looked up in the container's spatial index, which is
+        synced with container_placements unless an already synced index is passed in
         """
-        # Items that block are those that are in front of the target item
-        # (lower depth values in the same width/height ranges)
-        blocking_placements = []
+        if spatial_index is None:
+            spatial_index = self.get_container_index(container, container_placements)
         
-        target_start_w = target_placement.start_width
-        target_end_w = target_placement.end_width
-        target_start_h = target_placement.start_height
-        target_end_h = target_placement.end_height
-        target_start_d = target_placement.start_depth
+        # Items that block are those in front of the target item (lower depth values
+        # in the same width/height ranges) and, transitively, the items in front of those.
+        # The blocking graph returns them front to back, the order they come out in
+        blocking_placements = []
         
-        for placement in container_placements:
-            # Skip if it's the target placement
-            if placement.id == target_placement.id:
-                continue
+        for placement in spatial_index.get_retrieval_set(target_placement):
+            if items_by_id is None:
+                items_by_id = {item.id: item for item in all_items}
             
-            # Check if this placement is in front of the target
-            if (placement.end_depth <= target_start_d and  # In front of target (lower depth)
-                # Overlaps in width
-                ((placement.start_width < target_end_w and placement.end_width > target_start_w) or
-                 (target_start_w < placement.end_width and target_end_w > placement.start_width)) and
-                # Overlaps in height
-                ((placement.start_height < target_end_h and placement.end_height > target_start_h) or
-                 (target_start_h < placement.end_height and target_end_h > placement.start_height))):
-                
-                # Find the item for this placement
-                blocking_item = next((item for item in all_items if item.id == placement.item_id), None)
-                if blocking_item:
-                    blocking_placements.append((placement, blocking_item))
-        
-        # Sort by depth (those furthest from open face should be removed first)
-        blocking_placements.sort(key=lambda x: -x[0].start_depth)
+            # Find the item for this placement
+            blocking_item = items_by_id.get(placement.item_id)
+            if blocking_item:
+                blocking_placements.append((placement, blocking_item))
         
         return blocking_placements
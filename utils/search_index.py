@@ -0,0 +1,124 @@
+import threading
+import time
+from typing import List, Tuple, Iterable, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+class NameSearchIndex:
+    """
+    In-memory trigram index of item names, answering the same case-insensitive
+    substring queries as a scan of every name but only touching candidate items.
+    The index lives in one process and is kept current by the ORM events of that
+    process, so names written by other workers (or by statements that bypass the
+    ORM) are only picked up when it is rebuilt. With max_age_seconds set, the
+    index reports itself stale that long after a build so callers can reload it
+    """
+    
+    def __init__(self, max_age_seconds: Optional[float] = None):
+        self.names = {}  # item id -> lowercased name
+        self.trigrams = {}  # trigram -> set of item ids whose name contains it
+        self.is_built = False
+        self.built_at = None  # time.monotonic() of the last build
+        self.max_age_seconds = max_age_seconds
+        self.lock = threading.Lock()
+    
+    def get_trigrams(self, text: str) -> set:
+        """All three-character substrings of a lowercased string"""
+        return {text[i:i + 3] for i in range(len(text) - 2)}
+    
+    def build(self, items: Iterable[Tuple[str, str]]):
+        """Replace the index contents with (item id, name) pairs"""
+        with self.lock:
+            self.names = {}
+            self.trigrams = {}
+            for item_id, name in items:
+                self._add(item_id, name)
+            self.is_built = True
+            self.built_at = time.monotonic()
+        
+        logger.info(f"Built name index for {len(self.names)} items")
+    
+    def is_stale(self) -> bool:
+        """Check if the index has to be (re)built from the database before use"""
+        if not self.is_built:
+            return True
+        return self.max_age_seconds is not None and time.monotonic() - self.built_at > self.max_age_seconds
+    
+    def add_item(self, item_id: str, name: str):
+        """Index a new item, or re-index an existing one under its current name"""
+        with self.lock:
+            self._remove(item_id)
+            self._add(item_id, name)
+    
+    def remove_item(self, item_id: str):
+        """Drop an item from the index"""
+        with self.lock:
+            self._remove(item_id)
+    
+    def _add(self, item_id: str, name: str):
+        """Index a name under its trigrams; the caller holds the lock"""
+        name = (name or "").lower()
+        self.names[item_id] = name
+        for trigram in self.get_trigrams(name):
+            self.trigrams.setdefault(trigram, set()).add(item_id)
+    
+    def _remove(self, item_id: str):
+        """Drop an item's name and its trigram postings; the caller holds the lock"""
+        name = self.names.pop(item_id, None)
+        if name is None:
+            return
+        
+        for trigram in self.get_trigrams(name):
+            item_ids = self.trigrams.get(trigram)
+            if item_ids is not None:
+                item_ids.discard(item_id)
+                if not item_ids:
+                    del self.trigrams[trigram]
+    
+    def get_match_rank(self, query: str, name: str) -> int:
+        """
+        Rank of a name containing the query (lower is better): exact name,
+        name prefix, start of a word, then anywhere in the name
+        """
+        if name == query:
+            return 0
+        if name.startswith(query):
+            return 1
+        if any(word.startswith(query) for word in name.split()):
+            return 2
+        return 3
+    
+    def search(self, query: str, limit: Optional[int] = None) -> List[str]:
+        """
+        IDs of items whose name contains the query, best matches first.
+        Ties are broken by shorter names, then by item id
+        """
+        query = query.lower()
+        
+        with self.lock:
+            if len(query) < 3:
+                # Too short for trigrams, the names themselves are the cheapest index
+                candidates = self.names.keys()
+            else:
+                # Every trigram of the query must appear in a matching name; start
+                # from the rarest one so the intersection stays small
+                posting_lists = sorted(
+                    (self.trigrams.get(trigram, set()) for trigram in self.get_trigrams(query)), key=len
+                )
+                candidates = set(posting_lists[0])
+                for item_ids in posting_lists[1:]:
+                    candidates &= item_ids
+                    if not candidates:
+                        break
+            
+            # Trigrams can match out of order, so confirm the substring itself
+            matches = [
+                (self.get_match_rank(query, self.names[item_id]), len(self.names[item_id]), item_id)
+                for item_id in candidates if query in self.names[item_id]
+            ]
+        
+        matches.sort()
+        if limit is not None:
+            matches = matches[:limit]
+        return [item_id for _, _, item_id in matches]
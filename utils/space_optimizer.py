@@ -1,74 +1,414 @@
+import itertools
+import math
 import numpy as np
+import threading
+import time
+from collections import OrderedDict
 from typing import List, Dict, Tuple, Any, Optional
 import logging
 from models import Item, Container, ItemPlacement
 
 logger = logging.getLogger(__name__)
 
+# Candidate generation strategies for find_placement_for_item:
+# "scan" tests every cell of the container, "extreme_point" only tests the
+# corner points formed by existing items and the container walls, and
+# "vectorized" scores every cell of the container in one NumPy pass
+SEARCH_STRATEGIES = ("scan", "extreme_point", "vectorized")
+
+# Occupancy storage backends: "dense" keeps every cached container as an
+# int8 matrix plus its summed-area table, "packed" keeps only a small working
+# set dense and stores the other containers at 1 bit per cell
+OCCUPANCY_BACKENDS = ("dense", "packed")
+
 class SpaceOptimizer:
     """
     Class responsible for optimizing placement of items in containers
     using 3D bin packing algorithms
     """
     
-    def __init__(self):
+    def __init__(self, search_strategy: str = "vectorized", occupancy_backend: str = "dense",
+                 working_set_size: int = 4,
+                 max_eviction_set_size: int = 2, rearrangement_node_budget: int = 200,
+                 prefix_cache_size: int = 8):
+        if search_strategy not in SEARCH_STRATEGIES:
+            raise ValueError(f"Unknown search strategy: {search_strategy}")
+        if occupancy_backend not in OCCUPANCY_BACKENDS:
+            raise ValueError(f"Unknown occupancy backend: {occupancy_backend}")
+        
+        self.search_strategy = search_strategy
+        self.occupancy_backend = occupancy_backend
+        self.working_set_size = max(1, working_set_size)
         self.container_spaces = {}  # Cache of container space matrices
+        # Summed-area tables take several times the memory of their int8 matrix, so only the
+        # prefix_cache_size most recently used are kept; the others are rebuilt on next use
+        self.container_prefix_sums = OrderedDict()
+        self.prefix_cache_size = max(1, prefix_cache_size)
+        self.container_extreme_points = {}  # Cache of candidate anchor points per container
+        self.container_versions = {}  # Placement signature each cached matrix was built from
+        self.container_summaries = {}  # Free volume and free extents per container
+        self.container_infeasible_dims = {}  # Orientations known not to fit the container as it is
+        self.orientation_stats = {"evaluated": 0, "duplicate": 0, "exceeds_free_space": 0, "known_infeasible": 0}
+        self.packed_container_spaces = {}  # Bit-packed matrices of containers outside the working set
+        self.working_set = OrderedDict()  # Dense containers in least recently used order
+        # Rearrangement evicts up to max_eviction_set_size items at once and gives
+        # up after searching rearrangement_node_budget eviction sets for one item
+        self.max_eviction_set_size = max(1, max_eviction_set_size)
+        self.rearrangement_node_budget = max(1, rearrangement_node_budget)
+        self.rearrangement_candidate_limit = 8  # Lowest-priority items per container combined into sets
+        # The caches are shared by every request and searches patch them in place,
+        # so each search or planning pass holds the lock (reentrant, as they nest)
+        self.lock = threading.RLock()
     
     def reset_container_space(self, container_id: str):
         """Remove container from cache to force recalculation"""
-        if container_id in self.container_spaces:
-            del self.container_spaces[container_id]
+        with self.lock:
+            if container_id in self.container_spaces:
+                del self.container_spaces[container_id]
+            if container_id in self.packed_container_spaces:
+                del self.packed_container_spaces[container_id]
+            if container_id in self.working_set:
+                del self.working_set[container_id]
+            if container_id in self.container_versions:
+                del self.container_versions[container_id]
+            if container_id in self.container_prefix_sums:
+                del self.container_prefix_sums[container_id]
+            if container_id in self.container_extreme_points:
+                del self.container_extreme_points[container_id]
+            if container_id in self.container_summaries:
+                del self.container_summaries[container_id]
+            if container_id in self.container_infeasible_dims:
+                del self.container_infeasible_dims[container_id]
+    
+    def get_placement_box(self, placement: ItemPlacement) -> Tuple[int, int, int, int, int, int]:
+        """Return the placement's occupied box in whole cm as (start w, d, h, end w, d, h)"""
+        return (
+            int(placement.start_width), int(placement.start_depth), int(placement.start_height),
+            int(placement.end_width), int(placement.end_depth), int(placement.end_height)
+        )
+    
+    def get_placements_version(self, placements: List[ItemPlacement]) -> Tuple[int, int]:
+        """
+        Order-independent signature of a container's placement boxes.
+        A cached matrix is reused only while the placements still match it
+        """
+        return (len(placements), sum(hash(self.get_placement_box(p)) for p in placements))
     
     def get_container_space_matrix(self, container: Container, placements: List[ItemPlacement]) -> np.ndarray:
         """
         Create or retrieve a 3D matrix representing the container's space
         1 means occupied, 0 means free
         """
-        # Check if we have this in cache
-        if container.id in self.container_spaces:
-            return self.container_spaces[container.id]
-        
         # Create a new space matrix with granularity of 1cm
         width = int(container.width)
         depth = int(container.depth)
         height = int(container.height)
         
+        # Check if we have this in cache and it was built from the same placements
+        version = self.get_placements_version(placements)
+        if container.id in self.container_spaces:
+            cached_matrix = self.container_spaces[container.id]
+            if self.container_versions.get(container.id) == version and \
+               cached_matrix.shape == (width, depth, height):
+                self.touch_container_space(container.id)
+                return cached_matrix
+            
+            # Placements changed since the matrix was built, drop everything derived from it
+            self.reset_container_space(container.id)
+        
+        elif container.id in self.packed_container_spaces:
+            packed_matrix, shape = self.packed_container_spaces[container.id]
+            if self.container_versions.get(container.id) == version and shape == (width, depth, height):
+                # Bring the container back into the working set
+                space_matrix = self.unpack_space_matrix(packed_matrix, shape)
+                del self.packed_container_spaces[container.id]
+                
+                self.container_spaces[container.id] = space_matrix
+                self.touch_container_space(container.id)
+                return space_matrix
+            
+            self.reset_container_space(container.id)
+        
         space_matrix = np.zeros((width, depth, height), dtype=np.int8)
         
         # Mark occupied spaces based on existing placements
         for placement in placements:
-            start_w = int(placement.start_width)
-            start_d = int(placement.start_depth)
-            start_h = int(placement.start_height)
-            end_w = int(placement.end_width)
-            end_d = int(placement.end_depth)
-            end_h = int(placement.end_height)
+            start_w, start_d, start_h, end_w, end_d, end_h = self.get_placement_box(placement)
             
             # Mark as occupied
             space_matrix[start_w:end_w, start_d:end_d, start_h:end_h] = 1
         
         # Cache the result
         self.container_spaces[container.id] = space_matrix
+        self.container_versions[container.id] = version
+        self.touch_container_space(container.id)
         return space_matrix
     
+    def touch_container_space(self, container_id: str):
+        """
+        Mark a container's dense matrix as recently used. With the packed
+        backend, the least recently used containers beyond the working set
+        are compressed to 1 bit per cell and their summed-area tables dropped
+        """
+        if self.occupancy_backend != "packed":
+            return
+        
+        self.working_set[container_id] = True
+        self.working_set.move_to_end(container_id)
+        
+        while len(self.working_set) > self.working_set_size:
+            cold_id, _ = self.working_set.popitem(last=False)
+            space_matrix = self.container_spaces.pop(cold_id)
+            self.packed_container_spaces[cold_id] = (self.pack_space_matrix(space_matrix), space_matrix.shape)
+            if cold_id in self.container_prefix_sums:
+                del self.container_prefix_sums[cold_id]
+    
+    def pack_space_matrix(self, space_matrix: np.ndarray) -> np.ndarray:
+        """Compress a space matrix to 1 bit per cell"""
+        return np.packbits(space_matrix, axis=None)
+    
+    def unpack_space_matrix(self, packed_matrix: np.ndarray, shape: Tuple[int, int, int]) -> np.ndarray:
+        """Expand a bit-packed space matrix back to a dense int8 matrix"""
+        count = shape[0] * shape[1] * shape[2]
+        return np.unpackbits(packed_matrix, count=count).view(np.int8).reshape(shape)
+    
+    def get_cache_size(self) -> int:
+        """Return the number of bytes held by the occupancy caches"""
+        dense = sum(m.nbytes for m in self.container_spaces.values())
+        prefix = sum(p.nbytes for p in self.container_prefix_sums.values())
+        packed = sum(p.nbytes for p, _ in self.packed_container_spaces.values())
+        return dense + prefix + packed
+    
+    def get_container_prefix_sums(self, container: Container, placements: List[ItemPlacement]) -> np.ndarray:
+        """
+        Create or retrieve the 3D summed-area table of the container's space matrix
+        """
+        space_matrix = self.get_container_space_matrix(container, placements)
+        if container.id in self.container_prefix_sums:
+            self.container_prefix_sums.move_to_end(container.id)
+            return self.container_prefix_sums[container.id]
+        
+        prefix_sums = self.compute_prefix_sums(space_matrix)
+        
+        self.container_prefix_sums[container.id] = prefix_sums
+        while len(self.container_prefix_sums) > self.prefix_cache_size:
+            self.container_prefix_sums.popitem(last=False)
+        return prefix_sums
+    
+    def get_container_extreme_points(self, container: Container, placements: List[ItemPlacement]) -> set:
+        """
+        Create or retrieve the set of candidate anchor points (extreme points)
+        formed by the container walls and the placed items
+        """
+        self.get_container_space_matrix(container, placements)
+        if container.id in self.container_extreme_points:
+            return self.container_extreme_points[container.id]
+        
+        # The back-bottom-left corner is always a candidate
+        extreme_points = {(0, 0, 0)}
+        space_matrix = self.get_container_space_matrix(container, placements)
+        for placement in placements:
+            self.add_extreme_points(extreme_points, *self.get_placement_box(placement), space_matrix=space_matrix)
+        
+        self.container_extreme_points[container.id] = extreme_points
+        return extreme_points
+    
+    def add_extreme_points(self, extreme_points: set,
+                          start_w: int, start_d: int, start_h: int,
+                          end_w: int, end_d: int, end_h: int,
+                          space_matrix: Optional[np.ndarray] = None) -> set:
+        """
+        Update a set of extreme points for a newly occupied box: points covered
+        by the box are dropped and the corners it creates are added. If the
+        space matrix is given, the corners are also projected onto the
+        nearest occupied surface along each axis
+        """
+        covered = [
+            (w, d, h) for (w, d, h) in extreme_points
+            if start_w <= w < end_w and start_d <= d < end_d and start_h <= h < end_h
+        ]
+        extreme_points.difference_update(covered)
+        
+        # Corners beside, in front of and on top of the box, together with
+        # their projections onto the container walls
+        for w, d, h in ((end_w, start_d, start_h), (start_w, end_d, start_h), (start_w, start_d, end_h)):
+            extreme_points.add((w, d, h))
+            extreme_points.add((0, d, h))
+            extreme_points.add((w, 0, h))
+            extreme_points.add((w, d, 0))
+            if space_matrix is not None:
+                extreme_points.update(self.project_extreme_point(space_matrix, w, d, h))
+        
+        return extreme_points
+    
+    def project_extreme_point(self, space_matrix: np.ndarray, w: int, d: int, h: int) -> List[Tuple[int, int, int]]:
+        """
+        Project a point back along each axis until it meets an occupied cell or a wall
+        """
+        w_max, d_max, h_max = space_matrix.shape
+        if w >= w_max or d >= d_max or h >= h_max:
+            return []
+        
+        projections = []
+        for axis, line in enumerate((space_matrix[:w, d, h], space_matrix[w, :d, h], space_matrix[w, d, :h])):
+            occupied = np.flatnonzero(line)
+            point = [w, d, h]
+            point[axis] = int(occupied[-1]) + 1 if len(occupied) else 0
+            projections.append(tuple(point))
+        return projections
+    
+    def get_container_summary(self, container: Container, placements: List[ItemPlacement]) -> Dict:
+        """
+        Create or retrieve the capacity summary of a container: its free volume and the
+        longest free run of cells along each axis. No empty box in the container can be
+        longer than those runs, so they bound the largest empty box.
+        A summary outlives the dense matrix it was built from: containers packed out
+        of the working set keep theirs, so capacity checks never unpack a container
+        """
+        shape = (int(container.width), int(container.depth), int(container.height))
+        summary = self.container_summaries.get(container.id)
+        if summary is not None and summary["shape"] == shape and \
+           self.container_versions.get(container.id) == self.get_placements_version(placements):
+            return summary
+        
+        space_matrix = self.get_container_space_matrix(container, placements)
+        summary = {
+            "shape": shape,
+            "free_volume": space_matrix.size - int(np.count_nonzero(space_matrix)),
+            "free_runs": tuple(self.compute_max_free_run(space_matrix, axis) for axis in range(3))
+        }
+        
+        self.container_summaries[container.id] = summary
+        return summary
+    
+    def compute_max_free_run(self, space_matrix: np.ndarray, axis: int) -> int:
+        """Length of the longest run of free cells along one axis of the space matrix"""
+        if space_matrix.size == 0:
+            return 0
+        
+        shape = [1, 1, 1]
+        shape[axis] = space_matrix.shape[axis]
+        index = np.arange(1, space_matrix.shape[axis] + 1, dtype=np.int32).reshape(shape)
+        
+        # Distance from each cell back to the last occupied cell along the axis
+        last_occupied = np.where(space_matrix != 0, index, 0).astype(np.int32)
+        np.maximum.accumulate(last_occupied, axis=axis, out=last_occupied)
+        return int((index - last_occupied).max())
+    
+    def can_possibly_fit(self, item: Item, container: Container, placements: List[ItemPlacement]) -> bool:
+        """
+        Quick check against the container summary. False means the item provably
+        cannot be placed in the container, True means a full search is needed
+        """
+        summary = self.get_container_summary(container, placements)
+        if item.width * item.depth * item.height > summary["free_volume"]:
+            return False
+        
+        run_w, run_d, run_h = summary["free_runs"]
+        return any(
+            width <= run_w and depth <= run_d and height <= run_h
+            for width, depth, height in (o["dimensions"] for o in self.get_possible_orientations(item))
+        )
+    
+    def build_zone_index(self, containers: List[Container]) -> Dict[str, Tuple[List[Container], List[Container]]]:
+        """
+        Bucket containers by zone once. Maps each zone to its containers and the
+        containers of every other zone, both in their original order
+        """
+        zone_index = {}
+        for zone in dict.fromkeys(c.zone for c in containers):
+            zone_index[zone] = (
+                [c for c in containers if c.zone == zone],
+                [c for c in containers if c.zone != zone]
+            )
+        return zone_index
+    
+    def compute_prefix_sums(self, space_matrix: np.ndarray) -> np.ndarray:
+        """
+        Build a zero-padded 3D summed-area table for a space matrix.
+        prefix_sums[w, d, h] is the number of occupied cells in space_matrix[:w, :d, :h]
+        """
+        w_max, d_max, h_max = space_matrix.shape
+        dtype = np.int32 if space_matrix.size < np.iinfo(np.int32).max else np.int64
+        
+        prefix_sums = np.zeros((w_max + 1, d_max + 1, h_max + 1), dtype=dtype)
+        prefix_sums[1:, 1:, 1:] = space_matrix.cumsum(axis=0, dtype=dtype).cumsum(axis=1).cumsum(axis=2)
+        return prefix_sums
+    
+    def count_occupied(self, prefix_sums: np.ndarray,
+                      start_w: int, start_d: int, start_h: int,
+                      end_w: int, end_d: int, end_h: int) -> int:
+        """Count the occupied cells inside a box in constant time using the summed-area table"""
+        return int(
+            prefix_sums[end_w, end_d, end_h]
+            - prefix_sums[start_w, end_d, end_h]
+            - prefix_sums[end_w, start_d, end_h]
+            - prefix_sums[end_w, end_d, start_h]
+            + prefix_sums[start_w, start_d, end_h]
+            + prefix_sums[start_w, end_d, start_h]
+            + prefix_sums[end_w, start_d, start_h]
+            - prefix_sums[start_w, start_d, start_h]
+        )
+    
     def find_placement_for_item(self, item: Item, container: Container, 
-                               existing_placements: List[ItemPlacement]) -> Optional[Dict]:
+                               existing_placements: List[ItemPlacement],
+                               deadline: Optional[float] = None) -> Optional[Dict]:
         """
         Find the optimal placement for an item in a container
-        Returns placement coordinates or None if placement is not possible
+        Returns placement coordinates or None if placement is not possible.
+        When the deadline (a time.monotonic() value) passes, the best
+        placement found so far is returned
         """
-        logger.debug(f"Finding placement for item {item.id} in container {container.id}")
-        
-        # Get current space utilization
-        space_matrix = self.get_container_space_matrix(container, existing_placements)
+        with self.lock:
+            logger.debug(f"Finding placement for item {item.id} in container {container.id}")
+            
+            # Check if preferred zone matches. Preferred containers are searched
+            # first and the first hit is kept, so after a zero-penalty hit no
+            # other container is scanned
+            zone_score = 0 if container.zone == item.preferred_zone else 10000
+            if self.deadline_passed(deadline):
+                return None
+            
+            # Get current space utilization
+            space_matrix = self.get_container_space_matrix(container, existing_placements)
+            prefix_sums = self.get_container_prefix_sums(container, existing_placements)
+            extreme_points = None
+            if self.search_strategy == "extreme_point":
+                extreme_points = self.get_container_extreme_points(container, existing_placements)
+            free_runs = self.get_container_summary(container, existing_placements)["free_runs"]
+            infeasible_dims = self.container_infeasible_dims.setdefault(container.id, set())
+            
+            return self.search_container_space(
+                item, container, space_matrix, prefix_sums, extreme_points, free_runs,
+                infeasible_dims, zone_score, float('inf'), deadline
+            )
+    
+    def search_container_space(self, item: Item, container: Container,
+                              space_matrix: np.ndarray, prefix_sums: np.ndarray,
+                              extreme_points: Optional[set], free_runs: Tuple[int, int, int],
+                              infeasible_dims: set, zone_score: float, best_accessibility_score: float,
+                              deadline: Optional[float] = None) -> Optional[Dict]:
+        """
+        Search every orientation of the item in a prepared space matrix and
+        summed-area table. Orientations that turn out not to fit are added to
+        infeasible_dims
+        """
+        run_w, run_d, run_h = free_runs
         
-        # Try all possible orientations of the item
+        # Try all distinct orientations of the item
         orientations = self.get_possible_orientations(item)
+        stats = {"evaluated": 0, "duplicate": 6 - len(orientations), "exceeds_free_space": 0, "known_infeasible": 0}
         
+        # Partial box sums shared by orientations with the same width or footprint
+        partial_sums = {}
         best_placement = None
-        best_accessibility_score = float('inf')
         
         for orientation in orientations:
+            # A position at the open face, on the floor, with nothing in front
+            # scores exactly the zone penalty and cannot be beaten
+            if best_accessibility_score <= zone_score or self.deadline_passed(deadline):
+                break
+            
             width, depth, height = orientation['dimensions']
             rotation = orientation['rotation']
             
@@ -76,43 +416,183 @@ class SpaceOptimizer:
             if width > container.width or depth > container.depth or height > container.height:
                 continue
             
-            # Find possible placements with this orientation
-            possible_placements = self.find_possible_positions(space_matrix, width, depth, height)
+            # Skip orientations longer than any free run, or already found not to fit
+            if width > run_w or depth > run_d or height > run_h:
+                stats["exceeds_free_space"] += 1
+                continue
+            if (width, depth, height) in infeasible_dims:
+                stats["known_infeasible"] += 1
+                continue
             
-            for pos in possible_placements:
-                start_w, start_d, start_h = pos
-                
-                # Calculate end coordinates
-                end_w = start_w + width
-                end_d = start_d + depth
-                end_h = start_h + height
-                
-                # Calculate accessibility score (lower is better)
-                # Based on depth (further from open face is worse) and items above
-                accessibility_score = self.calculate_accessibility_score(
-                    space_matrix, start_w, start_d, start_h, end_w, end_d, end_h
-                )
-                
-                # Check if preferred zone matches
-                zone_score = 0 if container.zone == item.preferred_zone else 10000
-                
-                # Combine scores
-                total_score = accessibility_score + zone_score
-                
-                # Update best placement if this is better
-                if best_placement is None or total_score < best_accessibility_score:
-                    best_accessibility_score = total_score
-                    best_placement = {
-                        "startCoordinates": {"width": start_w, "depth": start_d, "height": start_h},
-                        "endCoordinates": {"width": end_w, "depth": end_d, "height": end_h},
-                        "rotation": rotation
-                    }
+            stats["evaluated"] += 1
+            unbounded = best_accessibility_score == float('inf')
+            result = self.search_orientation(
+                space_matrix, prefix_sums, extreme_points,
+                width, depth, height, zone_score, best_accessibility_score, partial_sums, deadline
+            )
+            if result is None:
+                # Without a score limit, no result from a full search means no valid position at all
+                if unbounded and not self.deadline_passed(deadline):
+                    infeasible_dims.add((width, depth, height))
+                continue
+            
+            # Update best placement, this orientation found a better one
+            best_accessibility_score, (start_w, start_d, start_h) = result
+            best_placement = {
+                "startCoordinates": {"width": start_w, "depth": start_d, "height": start_h},
+                "endCoordinates": {
+                    "width": start_w + width, "depth": start_d + depth, "height": start_h + height
+                },
+                "rotation": rotation
+            }
+        
+        for key, count in stats.items():
+            self.orientation_stats[key] += count
         
         return best_placement
     
+    def search_orientation(self, space_matrix: np.ndarray, prefix_sums: np.ndarray,
+                          extreme_points: Optional[set], width: int, depth: int, height: int,
+                          zone_score: float, score_limit: float,
+                          partial_sums: Optional[Dict] = None,
+                          deadline: Optional[float] = None) -> Optional[Tuple[float, Tuple[int, int, int]]]:
+        """
+        Find the best position for one orientation using the configured search strategy
+        Returns (total score, (w, d, h)) or None if nothing scores below score_limit
+        """
+        if self.search_strategy == "vectorized":
+            return self.select_best_scored_position(
+                prefix_sums, width, depth, height, zone_score, score_limit, partial_sums
+            )
+        
+        if self.search_strategy == "extreme_point":
+            positions = self.find_extreme_point_positions(
+                space_matrix, extreme_points, width, depth, height, prefix_sums
+            )
+            candidates = sorted(
+                ((self.get_score_lower_bound(d, h), (w, d, h)) for w, d, h in positions),
+                key=lambda candidate: (candidate[0], candidate[1][1], candidate[1][2], candidate[1][0])
+            )
+            result = self.select_best_position(
+                space_matrix, prefix_sums, candidates, width, depth, height, zone_score, score_limit, deadline
+            )
+            # Extreme points do not cover every position, so before reporting
+            # that nothing fits, score all of them
+            if result is None and not self.deadline_passed(deadline):
+                result = self.select_best_scored_position(
+                    prefix_sums, width, depth, height, zone_score, score_limit, partial_sums
+                )
+            return result
+        
+        candidates = self.iter_positions_best_first(prefix_sums, width, depth, height, deadline)
+        return self.select_best_position(
+            space_matrix, prefix_sums, candidates, width, depth, height, zone_score, score_limit, deadline
+        )
+    
+    def select_best_scored_position(self, prefix_sums: np.ndarray, width: int, depth: int, height: int,
+                                    zone_score: float, score_limit: float,
+                                    partial_sums: Optional[Dict] = None) -> Optional[Tuple[float, Tuple[int, int, int]]]:
+        """
+        Score every valid position at once and return (total score, (w, d, h))
+        of the best one, or None if nothing scores below score_limit
+        """
+        positions, scores = self.compute_placement_scores(prefix_sums, width, depth, height, partial_sums)
+        if len(scores) == 0:
+            return None
+        
+        # Positions come in (depth, height, width) order, so argmin breaks
+        # ties the same way as the position scan
+        best_index = int(np.argmin(scores))
+        total_score = int(scores[best_index]) + zone_score
+        if total_score >= score_limit:
+            return None
+        return total_score, tuple(int(i) for i in positions[best_index])
+    
+    def deadline_passed(self, deadline: Optional[float]) -> bool:
+        """Check a time.monotonic() deadline, None meaning no deadline"""
+        return deadline is not None and time.monotonic() >= deadline
+    
+    def get_score_lower_bound(self, start_d: int, start_h: int) -> float:
+        """
+        Lower bound of calculate_accessibility_score for a position, the score it
+        would get with nothing between it and the open face
+        """
+        return start_d * 2.0 + start_h * 1.0
+    
+    def iter_positions_best_first(self, prefix_sums: np.ndarray,
+                                 width: int, depth: int, height: int,
+                                 deadline: Optional[float] = None):
+        """
+        Lazily yield (lower bound, (w, d, h)) for every valid position of an item,
+        in increasing order of the accessibility score lower bound.
+        Generation stops early once the deadline passes
+        """
+        w_max, d_max, h_max = (n - 1 for n in prefix_sums.shape)
+        n_w, n_d, n_h = w_max - width + 1, d_max - depth + 1, h_max - height + 1
+        if n_w <= 0 or n_d <= 0 or n_h <= 0:
+            return
+        
+        # The lower bound 2 * d + h takes every integer value up to this one
+        for bound in range(2 * (n_d - 1) + n_h):
+            if self.deadline_passed(deadline):
+                return
+            for d in range(max(0, (bound - n_h + 2) // 2), min(n_d - 1, bound // 2) + 1):
+                h = bound - 2 * d
+                for w in range(n_w):
+                    # The space must be free, against the back wall or an item behind it, and supported below
+                    if self.count_occupied(prefix_sums, w, d, h, w + width, d + depth, h + height) == 0:
+                        if (d == 0 or self.count_occupied(prefix_sums, w, d - 1, h, w + width, d, h + height) > 0) and \
+                           (h == 0 or self.count_occupied(prefix_sums, w, d, h - 1, w + width, d + depth, h) > 0):
+                            yield self.get_score_lower_bound(d, h), (w, d, h)
+    
+    def select_best_position(self, space_matrix: np.ndarray, prefix_sums: np.ndarray,
+                            candidates, width: int, depth: int, height: int,
+                            zone_score: float, score_limit: float,
+                            deadline: Optional[float] = None) -> Optional[Tuple[float, Tuple[int, int, int]]]:
+        """
+        Branch and bound over candidate positions given in increasing lower bound order.
+        Stops as soon as no remaining candidate can beat the best score found. Equal
+        scores go to the smallest (depth, height, width), like the exhaustive scan.
+        If the deadline passes, the best position found so far is returned
+        """
+        best = None
+        
+        for bound, (start_w, start_d, start_h) in candidates:
+            if self.deadline_passed(deadline):
+                break
+            
+            # Without a hit only a strictly lower score than the limit counts,
+            # after a hit an equal score can still win on position
+            if best is None and bound + zone_score >= score_limit:
+                break
+            if best is not None and bound + zone_score > best[0]:
+                break
+            
+            accessibility_score = self.calculate_accessibility_score(
+                space_matrix, start_w, start_d, start_h,
+                start_w + width, start_d + depth, start_h + height, prefix_sums
+            )
+            total_score = accessibility_score + zone_score
+            
+            if best is None:
+                if total_score < score_limit:
+                    best = (total_score, (start_w, start_d, start_h))
+            elif total_score < best[0] or (
+                total_score == best[0] and
+                (start_d, start_h, start_w) < (best[1][1], best[1][2], best[1][0])
+            ):
+                best = (total_score, (start_w, start_d, start_h))
+        
+        return best
+    
     def get_possible_orientations(self, item: Item) -> List[Dict]:
-        """Return all possible orientations of the item (accounting for rotation)"""
-        w, d, h = item.width, item.depth, item.height
+        """
+        Return all distinct orientations of the item (accounting for rotation).
+        Rotations giving the same dimensions as an earlier one are left out.
+        Dimensions are rounded up to whole grid cells, as items loaded from the
+        database carry float dimensions
+        """
+        w, d, h = (int(math.ceil(x)) for x in (item.width, item.depth, item.height))
         
         # All possible orientations
         orientations = [
@@ -124,36 +604,121 @@ class SpaceOptimizer:
             {"dimensions": (h, d, w), "rotation": {"widthDepth": True, "widthHeight": True, "depthHeight": True}}
         ]
         
-        return orientations
+        distinct_orientations = []
+        seen_dimensions = set()
+        for orientation in orientations:
+            if orientation["dimensions"] not in seen_dimensions:
+                seen_dimensions.add(orientation["dimensions"])
+                distinct_orientations.append(orientation)
+        
+        return distinct_orientations
     
-    def find_possible_positions(self, space_matrix: np.ndarray, width: int, depth: int, height: int) -> List[Tuple[int, int, int]]:
-        """Find all possible positions for an item of given dimensions in the space"""
+    def find_extreme_point_positions(self, space_matrix: np.ndarray, extreme_points: set,
+                                    width: int, depth: int, height: int,
+                                    prefix_sums: Optional[np.ndarray] = None) -> List[Tuple[int, int, int]]:
+        """
+        Find possible positions for an item of given dimensions, testing only the
+        extreme points instead of every cell. Uses the same free-space and contact
+        rules as iter_positions_best_first, so the work scales with the number of items
+        """
         w_max, d_max, h_max = space_matrix.shape
         positions = []
         
-        # Always place items against at least one surface for stability
-        # This implementation prioritizes placing items at the bottom and back of the container
-        for w in range(w_max - width + 1):
-            for d in range(d_max - depth + 1):
-                for h in range(h_max - height + 1):
-                    # Check if the space is free
-                    if not np.any(space_matrix[w:w+width, d:d+depth, h:h+height]):
-                        # Prioritize positions that touch the back wall or other items
-                        if (d == 0 or np.any(space_matrix[w:w+width, d-1, h:h+height])) and \
-                           (h == 0 or np.any(space_matrix[w:w+width, d:d+depth, h-1])):
-                            positions.append((w, d, h))
-        
-        # Sort positions by accessibility (prefer closer to open face and lower height)
-        positions.sort(key=lambda pos: (pos[1], pos[2]))
+        if prefix_sums is None:
+            prefix_sums = self.compute_prefix_sums(space_matrix)
+        
+        for w, d, h in extreme_points:
+            # Skip anchors where the item would stick out of the container
+            if w + width > w_max or d + depth > d_max or h + height > h_max:
+                continue
+            
+            if self.count_occupied(prefix_sums, w, d, h, w + width, d + depth, h + height) == 0:
+                if (d == 0 or self.count_occupied(prefix_sums, w, d - 1, h, w + width, d, h + height) > 0) and \
+                   (h == 0 or self.count_occupied(prefix_sums, w, d, h - 1, w + width, d + depth, h) > 0):
+                    positions.append((w, d, h))
+        
+        # Same ordering as the exhaustive scan (depth, height, then width)
+        positions.sort(key=lambda pos: (pos[1], pos[2], pos[0]))
         
         return positions
     
+    def difference_along_axis(self, array: np.ndarray, axis: int, length: int) -> np.ndarray:
+        """
+        Difference of a cumulative array over windows of the given length along
+        one axis: result[i] = array[i + length] - array[i]
+        """
+        size = array.shape[axis]
+        upper = [slice(None)] * array.ndim
+        lower = [slice(None)] * array.ndim
+        upper[axis] = slice(length, size)
+        lower[axis] = slice(0, size - length)
+        return array[tuple(upper)] - array[tuple(lower)]
+    
+    def compute_placement_scores(self, prefix_sums: np.ndarray,
+                                width: int, depth: int, height: int,
+                                partial_sums: Optional[Dict] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Vectorized equivalent of iter_positions_best_first and calculate_accessibility_score
+        for one orientation. Feasibility of every anchor is computed in one pass over the
+        summed-area table. Returns the feasible positions as a (n, 3) array of (w, d, h)
+        sorted by (depth, height, width), and their accessibility scores.
+        Passing the same partial_sums dict for several orientations of one item reuses
+        the differences of orientations that share a width or a width x depth footprint
+        """
+        w_max, d_max, h_max = (n - 1 for n in prefix_sums.shape)
+        if width > w_max or depth > d_max or height > h_max:
+            return np.zeros((0, 3), dtype=np.int64), np.zeros(0, dtype=np.int64)
+        
+        n_d, n_h = d_max - depth + 1, h_max - height + 1
+        
+        # The box sums are separable, so the free-space and contact checks
+        # share their partial differences along the width and depth axes
+        if partial_sums is None:
+            partial_sums = {}
+        if (width,) not in partial_sums:
+            partial_sums[(width,)] = self.difference_along_axis(prefix_sums, 0, width)
+        width_sums = partial_sums[(width,)]
+        for footprint_depth in (depth, 1):
+            if (width, footprint_depth) not in partial_sums:
+                partial_sums[(width, footprint_depth)] = self.difference_along_axis(width_sums, 1, footprint_depth)
+        depth_sums = partial_sums[(width, depth)]
+        
+        # The space taken by the item must be free
+        feasible = self.difference_along_axis(depth_sums, 2, height) == 0
+        
+        # It must touch the back wall or an item behind it...
+        behind = self.difference_along_axis(partial_sums[(width, 1)], 2, height)
+        feasible[:, 1:, :] &= behind[:, :n_d - 1, :] > 0
+        
+        # ...and rest on the floor or an item below it
+        below = self.difference_along_axis(depth_sums, 2, 1)
+        feasible[:, :, 1:] &= below[:, :, :n_h - 1] > 0
+        
+        # Enumerate feasible anchors in (depth, height, width) order
+        w, d, h = np.nonzero(feasible)
+        order = np.lexsort((w, h, d))
+        w, d, h = w[order], d[order], h[order]
+        
+        # Occupied cells between the open face and the item's front
+        blocking_items = (
+            prefix_sums[w + width, d, h + height]
+            - prefix_sums[w, d, h + height]
+            - prefix_sums[w + width, d, h]
+            + prefix_sums[w, d, h]
+        ).astype(np.int64)
+        
+        scores = d * 2 + h + blocking_items * 10
+        
+        return np.stack([w, d, h], axis=1), scores
+    
     def calculate_accessibility_score(self, space_matrix: np.ndarray, 
                                      start_w: int, start_d: int, start_h: int,
-                                     end_w: int, end_d: int, end_h: int) -> float:
+                                     end_w: int, end_d: int, end_h: int,
+                                     prefix_sums: Optional[np.ndarray] = None) -> float:
         """
         Calculate how accessible an item would be if placed at the given position
-        Lower scores mean more accessible
+        Lower scores mean more accessible. With the matrix's summed-area table the
+        blocking count is a constant-time lookup instead of a sum over the slab
         """
         # Factors that affect accessibility:
         # 1. Depth from open face (higher depth = harder to access)
@@ -167,7 +732,10 @@ class SpaceOptimizer:
         blocking_items = 0
         if start_d > 0:
             # Consider a path from open face to this item
-            blocking_items = np.sum(space_matrix[start_w:end_w, 0:start_d, start_h:end_h])
+            if prefix_sums is not None:
+                blocking_items = self.count_occupied(prefix_sums, start_w, 0, start_h, end_w, start_d, end_h)
+            else:
+                blocking_items = np.sum(space_matrix[start_w:end_w, 0:start_d, start_h:end_h])
         
         # Weighted score
         return depth_factor + height_factor + (blocking_items * 10.0)
@@ -175,39 +743,237 @@ class SpaceOptimizer:
     def update_space_matrix(self, space_matrix: np.ndarray, 
                           start_w: int, start_d: int, start_h: int,
                           end_w: int, end_d: int, end_h: int, 
-                          value: int = 1) -> np.ndarray:
-        """Update the space matrix, marking a region as occupied (1) or free (0)"""
-        space_matrix[start_w:end_w, start_d:end_d, start_h:end_h] = value
+                          value: int = 1, prefix_sums: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Update the space matrix, marking a region as occupied (1) or free (0).
+        If the matrix's summed-area table is given, it is kept in sync incrementally
+        """
+        region = (slice(start_w, end_w), slice(start_d, end_d), slice(start_h, end_h))
+        
+        if prefix_sums is not None:
+            # Cumulative change inside the region, zero-padded like the table itself
+            delta = value - space_matrix[region].astype(prefix_sums.dtype)
+            region_sums = np.zeros(tuple(n + 1 for n in delta.shape), dtype=prefix_sums.dtype)
+            region_sums[1:, 1:, 1:] = delta.cumsum(axis=0).cumsum(axis=1).cumsum(axis=2)
+            
+            # Only table entries past the region start change. Beyond the region
+            # end they all take the region's total along that axis
+            w_max, d_max, h_max = space_matrix.shape
+            w_index = np.minimum(np.arange(start_w + 1, w_max + 1), end_w) - start_w
+            d_index = np.minimum(np.arange(start_d + 1, d_max + 1), end_d) - start_d
+            h_index = np.minimum(np.arange(start_h + 1, h_max + 1), end_h) - start_h
+            prefix_sums[start_w + 1:, start_d + 1:, start_h + 1:] += region_sums[np.ix_(w_index, d_index, h_index)]
+        
+        space_matrix[region] = value
         return space_matrix
     
-    def optimize_placement_for_items(self, items: List[Item], containers: List[Container],
-                                   existing_placements: Dict[str, List[ItemPlacement]]) -> Dict:
+    def record_placement(self, container: Container, placements: List[ItemPlacement],
+                        item_id: str, position: Dict) -> ItemPlacement:
         """
-        Find optimal placements for a list of items across available containers
-        Returns placements and any necessary rearrangements
+        Add a planned placement to a container's placement list and update the
+        cached space matrix, summed-area table and extreme points in place
         """
-        logger.info(f"Optimizing placement for {len(items)} items across {len(containers)} containers")
-        
-        # Sort items by priority (highest priority first)
-        sorted_items = sorted(items, key=lambda x: (-x.priority, x.id))
+        with self.lock:
+            start = position["startCoordinates"]
+            end = position["endCoordinates"]
+            rotation = position.get("rotation", {})
+            
+            placement = ItemPlacement(
+                item_id=item_id,
+                container_id=container.id,
+                start_width=start["width"],
+                start_depth=start["depth"],
+                start_height=start["height"],
+                end_width=end["width"],
+                end_depth=end["depth"],
+                end_height=end["height"],
+                rotated_width_depth=rotation.get("widthDepth", False),
+                rotated_width_height=rotation.get("widthHeight", False),
+                rotated_depth_height=rotation.get("depthHeight", False)
+            )
+            
+            # Only patch the cache if it reflects the list we are appending to
+            cache_current = self.container_versions.get(container.id) == self.get_placements_version(placements)
+            if cache_current:
+                space_matrix = self.get_container_space_matrix(container, placements)
+            placements.append(placement)
+            
+            if cache_current:
+                box = self.get_placement_box(placement)
+                self.update_space_matrix(
+                    space_matrix, *box,
+                    value=1, prefix_sums=self.container_prefix_sums.get(container.id)
+                )
+                if container.id in self.container_extreme_points:
+                    self.add_extreme_points(self.container_extreme_points[container.id], *box, space_matrix=space_matrix)
+                # New surfaces can make new positions valid
+                self.container_infeasible_dims.pop(container.id, None)
+                # Free runs can only shrink, so the old ones remain valid bounds
+                if container.id in self.container_summaries:
+                    start_w, start_d, start_h, end_w, end_d, end_h = box
+                    self.container_summaries[container.id]["free_volume"] -= \
+                        (end_w - start_w) * (end_d - start_d) * (end_h - start_h)
+                
+                count, signature = self.container_versions[container.id]
+                self.container_versions[container.id] = (count + 1, signature + hash(box))
+            
+            return placement
+    
+    def release_placement(self, container: Container, placements: List[ItemPlacement],
+                         placement: ItemPlacement):
+        """
+        Remove a placement from a container's placement list and free its
+        space in the cached space matrix
+        """
+        with self.lock:
+            cache_current = self.container_versions.get(container.id) == self.get_placements_version(placements)
+            if cache_current:
+                space_matrix = self.get_container_space_matrix(container, placements)
+            placements.remove(placement)
+            
+            if cache_current:
+                box = self.get_placement_box(placement)
+                self.update_space_matrix(
+                    space_matrix, *box,
+                    value=0, prefix_sums=self.container_prefix_sums.get(container.id)
+                )
+                self.container_infeasible_dims.pop(container.id, None)
+                # Freed corners and free runs cannot be derived incrementally, rebuild them on next use
+                if container.id in self.container_extreme_points:
+                    del self.container_extreme_points[container.id]
+                if container.id in self.container_summaries:
+                    del self.container_summaries[container.id]
+                
+                count, signature = self.container_versions[container.id]
+                self.container_versions[container.id] = (count - 1, signature - hash(box))
+    
+    def apply_rearrangement_steps(self, steps: List[Dict], containers_by_id: Dict[str, Container],
+                                 existing_placements: Dict[str, List[ItemPlacement]]):
+        """Replay rearrangement steps against the placement lists and cached space matrices"""
+        for step in steps:
+            if step["action"] == "remove":
+                container = containers_by_id[step["fromContainer"]]
+                container_placements = existing_placements.setdefault(container.id, [])
+                start = step["fromPosition"]["startCoordinates"]
+                
+                removed = next((
+                    p for p in container_placements
+                    if p.item_id == step["itemId"] and
+                    (p.start_width, p.start_depth, p.start_height) ==
+                    (start["width"], start["depth"], start["height"])
+                ), None)
+                if removed:
+                    self.release_placement(container, container_placements, removed)
+            
+            elif step["action"] == "place":
+                container = containers_by_id[step["toContainer"]]
+                container_placements = existing_placements.setdefault(container.id, [])
+                self.record_placement(container, container_placements, step["itemId"], step["toPosition"])
+    
+    def find_first_placement(self, item: Item, containers: List[Container],
+                            existing_placements: Dict[str, List[ItemPlacement]],
+                            deadline: Optional[float] = None) -> Tuple[Optional[Container], Optional[Dict]]:
+        """Find a placement for the item in the first container of the list that can hold it"""
+        with self.lock:
+            # Drop containers the capacity index rules out without searching them
+            containers = [
+                c for c in containers
+                if self.can_possibly_fit(item, c, existing_placements.setdefault(c.id, []))
+            ]
+            
+            for container in containers:
+                container_placements = existing_placements[container.id]
+                placement = self.find_placement_for_item(item, container, container_placements, deadline=deadline)
+                if placement:
+                    return container, placement
+            return None, None
+    
+    def log_orientation_stats(self, stats_before: Dict[str, int]):
+        """Log how many orientations were searched and pruned since the stats_before snapshot"""
+        stats = {key: self.orientation_stats[key] - stats_before[key] for key in stats_before}
+        logger.info(
+            f"Orientations evaluated: {stats['evaluated']}, pruned: "
+            f"{stats['duplicate'] + stats['exceeds_free_space'] + stats['known_infeasible']} "
+            f"(duplicate {stats['duplicate']}, exceeds free space {stats['exceeds_free_space']}, "
+            f"known infeasible {stats['known_infeasible']})"
+        )
+    
+    def get_utilization_stats(self, containers: List[Container],
+                              existing_placements: Dict[str, List[ItemPlacement]]) -> Dict:
+        """
+        Volume utilization per container and across all containers, from the
+        placement boxes, and the bytes held by the occupancy caches
+        """
+        container_utilization = {}
+        total_volume = 0
+        total_used = 0
         
-        # Track placements and rearrangements
-        placements = []
-        rearrangements = []
-        rearrangement_step = 1
+        for container in containers:
+            volume = int(container.width) * int(container.depth) * int(container.height)
+            used = 0
+            for placement in existing_placements.get(container.id, []):
+                start_w, start_d, start_h, end_w, end_d, end_h = self.get_placement_box(placement)
+                used += (end_w - start_w) * (end_d - start_d) * (end_h - start_h)
+            
+            container_utilization[container.id] = round(used / volume, 4) if volume else 0.0
+            total_volume += volume
+            total_used += used
         
-        # First try to place items in their preferred zones
-        for item in sorted_items:
-            placed = False
+        return {
+            "utilization": round(total_used / total_volume, 4) if total_volume else 0.0,
+            "containerUtilization": container_utilization,
+            "cacheBytes": self.get_cache_size()
+        }
+    
+    def optimize_placement_for_items(self, items: List[Item], containers: List[Container],
+                                   existing_placements: Dict[str, List[ItemPlacement]],
+                                   deadline: Optional[float] = None) -> Dict:
+        """
+        Find optimal placements for a list of items across available containers
+        Returns placements and any necessary rearrangements.
+        Items are placed one at a time in priority order, so when the deadline
+        (a time.monotonic() value) passes, the plan built so far is returned
+        and the remaining items are reported as unplaced
+        """
+        with self.lock:
+            logger.info(f"Optimizing placement for {len(items)} items across {len(containers)} containers")
+            started_at = time.perf_counter()
             
-            # First try preferred zone containers
-            preferred_containers = [c for c in containers if c.zone == item.preferred_zone]
-            for container in preferred_containers:
-                # Get existing placements for this container
-                container_placements = existing_placements.get(container.id, [])
+            # Sort items by priority (highest priority first)
+            sorted_items = sorted(items, key=lambda x: (-x.priority, x.id))
+            stats_before = dict(self.orientation_stats)
+            
+            # Work on copies of the placement lists so planned placements can be
+            # appended without touching the caller's lists
+            existing_placements = {
+                container_id: list(container_placements)
+                for container_id, container_placements in existing_placements.items()
+            }
+            containers_by_id = {container.id: container for container in containers}
+            item_index = {item.id: item for item in sorted_items}
+            zone_index = self.build_zone_index(containers)
+            
+            # Track placements and rearrangements
+            placements = []
+            rearrangements = []
+            unplaced_items = []
+            rearrangement_step = 1
+            
+            for item in sorted_items:
+                if self.deadline_passed(deadline):
+                    unplaced_items.append({"itemId": item.id, "reason": "deadline_exceeded"})
+                    continue
+                
+                # First try preferred zone containers, then any container
+                preferred_containers, other_containers = zone_index.get(item.preferred_zone, ([], containers))
+                container, placement = self.find_first_placement(
+                    item, preferred_containers, existing_placements, deadline
+                )
+                if not placement:
+                    container, placement = self.find_first_placement(
+                        item, other_containers, existing_placements, deadline
+                    )
                 
-                # Try to find placement
-                placement = self.find_placement_for_item(item, container, container_placements)
                 if placement:
                     # Add to placements
                     placements.append({
@@ -217,154 +983,285 @@ class SpaceOptimizer:
                     })
                     
                     # Update container space
-                    self.reset_container_space(container.id)
-                    placed = True
-                    break
-            
-            # If not placed in preferred zone, try any container
-            if not placed:
-                other_containers = [c for c in containers if c.zone != item.preferred_zone]
-                for container in other_containers:
-                    # Get existing placements for this container
-                    container_placements = existing_placements.get(container.id, [])
-                    
-                    # Try to find placement
-                    placement = self.find_placement_for_item(item, container, container_placements)
-                    if placement:
-                        # Add to placements
-                        placements.append({
-                            "itemId": item.id,
-                            "containerId": container.id,
-                            "position": placement
-                        })
-                        
-                        # Update container space
-                        self.reset_container_space(container.id)
-                        placed = True
-                        break
-            
-            # If still not placed, try rearrangements
-            if not placed:
+                    self.record_placement(container, existing_placements[container.id], item.id, placement)
+                    continue
+                
+                # If still not placed, try rearrangements
                 rearrangement_result = self.attempt_rearrangement(
-                    item, containers, existing_placements, rearrangement_step, sorted_items
+                    item, containers, existing_placements, rearrangement_step, sorted_items, zone_index, deadline,
+                    item_index
                 )
                 
                 if rearrangement_result:
                     placements.append(rearrangement_result["placement"])
                     rearrangements.extend(rearrangement_result["steps"])
+                    self.apply_rearrangement_steps(
+                        rearrangement_result["steps"], containers_by_id, existing_placements
+                    )
                     rearrangement_step += len(rearrangement_result["steps"])
-                    placed = True
-        
-        return {
-            "success": len(placements) == len(sorted_items),
-            "placements": placements,
-            "rearrangements": rearrangements
-        }
+                elif self.deadline_passed(deadline):
+                    unplaced_items.append({"itemId": item.id, "reason": "deadline_exceeded"})
+                else:
+                    unplaced_items.append({"itemId": item.id, "reason": "no_space"})
+            
+            self.log_orientation_stats(stats_before)
+            
+            stats = self.get_utilization_stats(containers, existing_placements)
+            stats["itemsPlaced"] = len(placements)
+            stats["runtimeMs"] = round((time.perf_counter() - started_at) * 1000, 2)
+            
+            return {
+                "success": len(placements) == len(sorted_items),
+                "placements": placements,
+                "rearrangements": rearrangements,
+                "unplacedItems": unplaced_items,
+                "deadlineExceeded": any(u["reason"] == "deadline_exceeded" for u in unplaced_items),
+                "stats": stats
+            }
     
     def attempt_rearrangement(self, item: Item, containers: List[Container],
                             existing_placements: Dict[str, List[ItemPlacement]],
-                            start_step: int, items: Optional[List[Item]] = None) -> Optional[Dict]:
+                            start_step: int, items: Optional[List[Item]] = None,
+                            zone_index: Optional[Dict[str, Tuple[List[Container], List[Container]]]] = None,
+                            deadline: Optional[float] = None,
+                            item_index: Optional[Dict[str, Item]] = None) -> Optional[Dict]:
         """
         Attempt to rearrange items to make room for a new item
-        Returns placement and rearrangement steps if successful
+        Returns placement and rearrangement steps if successful.
+        Sets of up to max_eviction_set_size lower priority items are tried, smaller
+        sets and lower priorities first, until rearrangement_node_budget sets have
+        been searched or the deadline passes
         """
         logger.info(f"Attempting rearrangement to place item {item.id}")
         
         # If no items provided, we can't do rearrangement
-        if items is None:
+        if items is None or self.deadline_passed(deadline):
             return None
-        
-        # This is a simplified rearrangement algorithm
-        # In a real system, you would use more sophisticated approaches
+        if item_index is None:
+            item_index = {i.id: i for i in items}
         
         # Start with preferred zone containers
-        preferred_containers = [c for c in containers if c.zone == item.preferred_zone]
-        other_containers = [c for c in containers if c.zone != item.preferred_zone]
-        all_containers = preferred_containers + other_containers
+        if zone_index is None:
+            zone_index = self.build_zone_index(containers)
+        preferred_containers, other_containers = zone_index.get(item.preferred_zone, ([], containers))
+        item_volume = item.width * item.depth * item.height
         
-        for container in all_containers:
-            # Get existing placements for this container
+        # Find low priority items that could be moved out of each container
+        eviction_candidates = []
+        for container in preferred_containers + other_containers:
             container_placements = existing_placements.get(container.id, [])
-            
-            # Find low priority items that could be moved
             low_priority_placements = []
             for placement in container_placements:
-                # Find the item associated with this placement
-                placed_item = next((i for i in items if i.id == placement.item_id), None)
+                placed_item = item_index.get(placement.item_id)
                 if placed_item and placed_item.priority < item.priority:
                     low_priority_placements.append((placement, placed_item))
             
-            # Sort by priority (lowest first)
-            low_priority_placements.sort(key=lambda x: x[1].priority)
-            
-            # Try removing one low priority item at a time
-            for removal_placement, removal_item in low_priority_placements:
-                # Temporarily remove this placement
-                temp_placements = [p for p in container_placements if p.id != removal_placement.id]
+            if low_priority_placements:
+                # Sort by priority (lowest first)
+                low_priority_placements.sort(key=lambda x: x[1].priority)
+                free_volume = self.get_container_summary(container, container_placements)["free_volume"]
+                eviction_candidates.append((container, low_priority_placements, free_volume))
+        
+        # Destinations found for a moved item when nothing else moves along with it
+        relocations = {}
+        nodes = 0
+        
+        for set_size in range(1, self.max_eviction_set_size + 1):
+            for container, low_priority_placements, free_volume in eviction_candidates:
+                container_placements = existing_placements.get(container.id, [])
+                if set_size > 1:
+                    low_priority_placements = low_priority_placements[:self.rearrangement_candidate_limit]
+                eviction_sets = sorted(
+                    itertools.combinations(low_priority_placements, set_size),
+                    key=lambda eviction_set: sum(placed_item.priority for _, placed_item in eviction_set)
+                )
                 
-                # Check if the new item fits now
-                placement = self.find_placement_for_item(item, container, temp_placements)
-                if placement:
-                    # Find a new container for the removed item
-                    new_container = None
-                    new_placement = None
+                for eviction_set in eviction_sets:
+                    if self.deadline_passed(deadline) or nodes >= self.rearrangement_node_budget:
+                        return None
                     
-                    for other_container in containers:
-                        if other_container.id != container.id:
-                            other_container_placements = existing_placements.get(other_container.id, [])
-                            other_placement = self.find_placement_for_item(
-                                removal_item, other_container, other_container_placements
-                            )
-                            if other_placement:
-                                new_container = other_container
-                                new_placement = other_placement
-                                break
+                    # Skip evictions that cannot free enough volume for the new item
+                    removed_boxes = [self.get_placement_box(placement) for placement, _ in eviction_set]
+                    if item_volume > free_volume + sum(self.get_box_volume(box) for box in removed_boxes):
+                        continue
+                    nodes += 1
+                    
+                    # Check if the new item fits without the evicted items
+                    placement = self.find_placement_with_changes(
+                        item, container, container_placements, removed_boxes=removed_boxes, deadline=deadline
+                    )
+                    if not placement:
+                        continue
                     
-                    if new_container and new_placement:
-                        # We found a valid rearrangement
-                        steps = [
-                            {
-                                "step": start_step,
-                                "action": "remove",
-                                "itemId": removal_item.id,
-                                "fromContainer": container.id,
-                                "fromPosition": {
-                                    "startCoordinates": {
-                                        "width": removal_placement.start_width,
-                                        "depth": removal_placement.start_depth,
-                                        "height": removal_placement.start_height
-                                    },
-                                    "endCoordinates": {
-                                        "width": removal_placement.end_width,
-                                        "depth": removal_placement.end_depth,
-                                        "height": removal_placement.end_height
-                                    }
-                                }
-                            },
-                            {
-                                "step": start_step + 1,
-                                "action": "place",
-                                "itemId": removal_item.id,
-                                "toContainer": new_container.id,
-                                "toPosition": new_placement
-                            },
-                            {
-                                "step": start_step + 2,
-                                "action": "place",
-                                "itemId": item.id,
-                                "toContainer": container.id,
-                                "toPosition": placement
-                            }
-                        ]
-                        
-                        return {
-                            "placement": {
-                                "itemId": item.id,
-                                "containerId": container.id,
-                                "position": placement
-                            },
-                            "steps": steps
-                        }
+                    # Find new containers for the removed items
+                    moves = self.find_relocations(
+                        eviction_set, container, containers, existing_placements, relocations, deadline
+                    )
+                    if moves is None:
+                        continue
+                    
+                    # We found a valid rearrangement
+                    return {
+                        "placement": {
+                            "itemId": item.id,
+                            "containerId": container.id,
+                            "position": placement
+                        },
+                        "steps": self.build_rearrangement_steps(
+                            item, container, placement, eviction_set, moves, start_step
+                        )
+                    }
         
         # Could not find a valid rearrangement
         return None
+    
+    def find_relocations(self, eviction_set: Tuple[Tuple[ItemPlacement, Item], ...], source_container: Container,
+                         containers: List[Container], existing_placements: Dict[str, List[ItemPlacement]],
+                         relocations: Dict[Tuple[str, str], Optional[Dict]],
+                         deadline: Optional[float] = None) -> Optional[List[Tuple[Item, Container, Dict]]]:
+        """
+        Find a place outside the source container for every evicted item, largest first.
+        Returns (item, container, position) moves, or None if any item cannot be moved
+        """
+        moves = []
+        # Boxes claimed by items of this set moved earlier, per destination container
+        claimed_boxes = {}
+        
+        for _, moved_item in sorted(eviction_set, key=lambda x: -(x[1].width * x[1].depth * x[1].height)):
+            move = None
+            for other_container in containers:
+                if other_container.id == source_container.id:
+                    continue
+                other_container_placements = existing_placements.get(other_container.id, [])
+                
+                if other_container.id in claimed_boxes:
+                    position = self.find_placement_with_changes(
+                        moved_item, other_container, other_container_placements,
+                        added_boxes=claimed_boxes[other_container.id], deadline=deadline
+                    )
+                else:
+                    key = (moved_item.id, other_container.id)
+                    if key not in relocations:
+                        relocations[key] = None
+                        if self.can_possibly_fit(moved_item, other_container, other_container_placements):
+                            relocations[key] = self.find_placement_for_item(
+                                moved_item, other_container, other_container_placements, deadline=deadline
+                            )
+                    position = relocations[key]
+                
+                if position:
+                    move = (moved_item, other_container, position)
+                    break
+            
+            if move is None:
+                return None
+            moves.append(move)
+            claimed_boxes.setdefault(move[1].id, []).append(self.get_position_box(move[2]))
+        
+        return moves
+    
+    def build_rearrangement_steps(self, item: Item, container: Container, position: Dict,
+                                  eviction_set: Tuple[Tuple[ItemPlacement, Item], ...],
+                                  moves: List[Tuple[Item, Container, Dict]], start_step: int) -> List[Dict]:
+        """Steps to take the evicted items out, stow them elsewhere and then place the new item"""
+        steps = []
+        for removal_placement, removal_item in eviction_set:
+            steps.append({
+                "step": start_step + len(steps),
+                "action": "remove",
+                "itemId": removal_item.id,
+                "fromContainer": container.id,
+                "fromPosition": {
+                    "startCoordinates": {
+                        "width": removal_placement.start_width,
+                        "depth": removal_placement.start_depth,
+                        "height": removal_placement.start_height
+                    },
+                    "endCoordinates": {
+                        "width": removal_placement.end_width,
+                        "depth": removal_placement.end_depth,
+                        "height": removal_placement.end_height
+                    }
+                }
+            })
+        
+        for moved_item, new_container, new_position in moves:
+            steps.append({
+                "step": start_step + len(steps),
+                "action": "place",
+                "itemId": moved_item.id,
+                "toContainer": new_container.id,
+                "toPosition": new_position
+            })
+        
+        steps.append({
+            "step": start_step + len(steps),
+            "action": "place",
+            "itemId": item.id,
+            "toContainer": container.id,
+            "toPosition": position
+        })
+        return steps
+    
+    def find_placement_with_changes(self, item: Item, container: Container, placements: List[ItemPlacement],
+                                    removed_boxes: List[Tuple[int, ...]] = (),
+                                    added_boxes: List[Tuple[int, ...]] = (),
+                                    deadline: Optional[float] = None) -> Optional[Dict]:
+        """
+        Find the optimal placement for an item as if the removed boxes were
+        freed and the added boxes occupied. The cached space matrix and
+        summed-area table are patched in place for the search and restored
+        afterwards, so no grid is rebuilt or copied. The lock keeps other
+        threads from seeing the patched arrays
+        """
+        with self.lock:
+            zone_score = 0 if container.zone == item.preferred_zone else 10000
+            space_matrix = self.get_container_space_matrix(container, placements)
+            prefix_sums = self.get_container_prefix_sums(container, placements)
+            
+            # Occupying more space only shrinks free runs and keeps infeasible orientations
+            # infeasible; freeing space can undo both, so fall back to the container bounds
+            if removed_boxes:
+                free_runs = (int(container.width), int(container.depth), int(container.height))
+                infeasible_dims = set()
+            else:
+                free_runs = self.get_container_summary(container, placements)["free_runs"]
+                infeasible_dims = set(self.container_infeasible_dims.get(container.id, ()))
+            
+            extreme_points = None
+            if self.search_strategy == "extreme_point":
+                # Freed boxes expose their own corners as anchors
+                extreme_points = set(self.get_container_extreme_points(container, placements))
+                extreme_points.update(box[:3] for box in removed_boxes)
+                for box in added_boxes:
+                    self.add_extreme_points(extreme_points, *box)
+            
+            for box in removed_boxes:
+                self.update_space_matrix(space_matrix, *box, value=0, prefix_sums=prefix_sums)
+            for box in added_boxes:
+                self.update_space_matrix(space_matrix, *box, value=1, prefix_sums=prefix_sums)
+            
+            try:
+                return self.search_container_space(
+                    item, container, space_matrix, prefix_sums, extreme_points, free_runs,
+                    infeasible_dims, zone_score, float('inf'), deadline
+                )
+            finally:
+                for box in added_boxes:
+                    self.update_space_matrix(space_matrix, *box, value=0, prefix_sums=prefix_sums)
+                for box in removed_boxes:
+                    self.update_space_matrix(space_matrix, *box, value=1, prefix_sums=prefix_sums)
+    
+    def get_box_volume(self, box: Tuple[int, int, int, int, int, int]) -> int:
+        """Volume of a (start w, d, h, end w, d, h) box"""
+        start_w, start_d, start_h, end_w, end_d, end_h = box
+        return (end_w - start_w) * (end_d - start_d) * (end_h - start_h)
+    
+    def get_position_box(self, position: Dict) -> Tuple[int, int, int, int, int, int]:
+        """Box of a placement result's start and end coordinates"""
+        start = position["startCoordinates"]
+        end = position["endCoordinates"]
+        return (
+            int(start["width"]), int(start["depth"]), int(start["height"]),
+            int(end["width"]), int(end["depth"]), int(end["height"])
+        )
@@ -0,0 +1,173 @@
+import bisect
+import itertools
+from typing import List, Tuple
+import logging
+from models import ItemPlacement
+
+logger = logging.getLogger(__name__)
+
+class ContainerSpatialIndex:
+    """
+    In-memory index of the placements in one container: a uniform grid over the
+    (width, height) footprint, each cell holding its placements sorted by end depth.
+    Placements are identified by their row id, so the index outlives the
+    session that loaded them.
+    It also maintains the blocking graph of the container: an edge from A to B
+    means A lies entirely in front of B within B's footprint, so A has to come
+    out first. Edges always point deeper, so the graph is acyclic
+    """
+    
+    def __init__(self, container_id: str, cell_size: float = 10.0):
+        self.container_id = container_id
+        self.cell_size = cell_size
+        self.buckets = {}  # (width cell, height cell) -> sorted [(end depth, sequence, placement id)]
+        self.entries = {}  # placement id -> (box, sequence)
+        self.placements = {}  # placement id -> ItemPlacement object from the latest sync
+        self.version = (0, 0)  # Signature of the indexed boxes, as in SpaceOptimizer
+        self.sequence = itertools.count()  # Insertion order, used to break depth ties
+        self.direct_blockers = {}  # Placement id -> ids of the placements directly blocking it, built lazily
+    
+    def get_placement_box(self, placement: ItemPlacement) -> Tuple[float, float, float, float, float, float]:
+        """Return the placement's box as (start w, d, h, end w, d, h)"""
+        return (
+            placement.start_width, placement.start_depth, placement.start_height,
+            placement.end_width, placement.end_depth, placement.end_height
+        )
+    
+    def get_cells(self, start_w: float, start_h: float, end_w: float, end_h: float):
+        """Grid cells touched by a (width, height) footprint"""
+        return itertools.product(
+            range(int(start_w // self.cell_size), int(end_w // self.cell_size) + 1),
+            range(int(start_h // self.cell_size), int(end_h // self.cell_size) + 1)
+        )
+    
+    def add_placement(self, placement: ItemPlacement):
+        """Index a placement, replacing any earlier box indexed for the same id"""
+        if placement.id in self.entries:
+            self.remove_placement(placement.id)
+        
+        box = self.get_placement_box(placement)
+        sequence = next(self.sequence)
+        start_w, _, start_h, end_w, end_d, end_h = box
+        for cell in self.get_cells(start_w, start_h, end_w, end_h):
+            bisect.insort(self.buckets.setdefault(cell, []), (end_d, sequence, placement.id))
+        
+        self.entries[placement.id] = (box, sequence)
+        self.placements[placement.id] = placement
+        self.invalidate_blocked_by(box)
+        count, signature = self.version
+        self.version = (count + 1, signature + hash((placement.id, box)))
+    
+    def remove_placement(self, placement_id: int):
+        """Drop a placement from the index"""
+        if placement_id not in self.entries:
+            return
+        
+        box, sequence = self.entries.pop(placement_id)
+        self.placements.pop(placement_id, None)
+        self.direct_blockers.pop(placement_id, None)
+        self.invalidate_blocked_by(box)
+        start_w, _, start_h, end_w, end_d, end_h = box
+        entry = (end_d, sequence, placement_id)
+        for cell in self.get_cells(start_w, start_h, end_w, end_h):
+            bucket = self.buckets[cell]
+            del bucket[bisect.bisect_left(bucket, entry)]
+            if not bucket:
+                del self.buckets[cell]
+        
+        count, signature = self.version
+        self.version = (count - 1, signature - hash((placement_id, box)))
+    
+    def sync(self, placements: List[ItemPlacement]):
+        """
+        Bring the index in line with the container's current placements. Only
+        placements that were added, moved or removed since the last sync are
+        re-indexed; unchanged ones just have their object refreshed
+        """
+        current = {placement.id: placement for placement in placements}
+        version = (len(current), sum(hash((pid, self.get_placement_box(p))) for pid, p in current.items()))
+        
+        if version != self.version:
+            for placement_id in [pid for pid in self.entries if pid not in current]:
+                self.remove_placement(placement_id)
+            for placement_id, placement in current.items():
+                entry = self.entries.get(placement_id)
+                if entry is None or entry[0] != self.get_placement_box(placement):
+                    self.add_placement(placement)
+        
+        self.placements = current
+    
+    def find_blocking_placements(self, target_placement: ItemPlacement) -> List[ItemPlacement]:
+        """
+        Placements entirely in front of the target (ending at or before its start
+        depth) that overlap its (width, height) footprint, in insertion order
+        """
+        start_w, start_d, start_h, end_w, _, end_h = self.get_placement_box(target_placement)
+        
+        found = {}
+        for cell in self.get_cells(start_w, start_h, end_w, end_h):
+            bucket = self.buckets.get(cell)
+            if not bucket:
+                continue
+            
+            # Entries are sorted by end depth, so only a prefix of the cell is in front of the target
+            stop = bisect.bisect_right(bucket, (start_d, float('inf')))
+            for _, sequence, placement_id in bucket[:stop]:
+                if placement_id in found or placement_id == target_placement.id:
+                    continue
+                
+                box = self.entries[placement_id][0]
+                if box[0] < end_w and box[3] > start_w and box[2] < end_h and box[5] > start_h:
+                    found[placement_id] = sequence
+        
+        return [self.placements[placement_id] for placement_id in sorted(found, key=found.get)]
+    
+    def overlaps_footprint(self, box: Tuple, start_w: float, start_h: float, end_w: float, end_h: float) -> bool:
+        """Check if a box overlaps a (width, height) footprint"""
+        return box[0] < end_w and box[3] > start_w and box[2] < end_h and box[5] > start_h
+    
+    def invalidate_blocked_by(self, box: Tuple):
+        """
+        Drop the cached blocker lists that a box added or removed at this
+        position can change: those of placements behind it in its footprint
+        """
+        if not self.direct_blockers:
+            return
+        
+        start_w, _, start_h, end_w, end_d, end_h = box
+        for cell in self.get_cells(start_w, start_h, end_w, end_h):
+            for _, _, placement_id in self.buckets.get(cell, ()):
+                if placement_id in self.direct_blockers:
+                    other_box = self.entries[placement_id][0]
+                    if other_box[1] >= end_d and self.overlaps_footprint(other_box, start_w, start_h, end_w, end_h):
+                        del self.direct_blockers[placement_id]
+    
+    def get_direct_blockers(self, placement_id: int) -> List[int]:
+        """Ids of the placements directly in front of a placement, cached until a neighbour changes"""
+        if placement_id not in self.direct_blockers:
+            self.direct_blockers[placement_id] = [
+                blocker.id for blocker in self.find_blocking_placements(self.placements[placement_id])
+            ]
+        return self.direct_blockers[placement_id]
+    
+    def get_retrieval_set(self, target_placement: ItemPlacement) -> List[ItemPlacement]:
+        """
+        Every placement that has to come out before the target, following the
+        blocking graph transitively, in a valid removal order (front to back)
+        """
+        if target_placement.id in self.entries:
+            pending = list(self.get_direct_blockers(target_placement.id))
+        else:
+            pending = [blocker.id for blocker in self.find_blocking_placements(target_placement)]
+        
+        found = set()
+        while pending:
+            placement_id = pending.pop()
+            if placement_id in found:
+                continue
+            found.add(placement_id)
+            pending.extend(self.get_direct_blockers(placement_id))
+        
+        # A blocker always starts shallower than what it blocks, so depth order is a topological order
+        ordered = sorted(found, key=lambda pid: (self.entries[pid][0][1], self.entries[pid][1]))
+        return [self.placements[placement_id] for placement_id in ordered]
@@ -0,0 +1,156 @@
+from typing import List, Dict, Optional
+import logging
+import numpy as np
+from datetime import datetime, timedelta
+from models import Item
+
+logger = logging.getLogger(__name__)
+
+class StationSimulator:
+    """
+    Class responsible for multi-day what-if scenarios. The inventory is copied
+    into NumPy arrays, daily usage and expiry are applied to the arrays, and
+    nothing is written back; the final state is returned for the caller to
+    commit or discard
+    """
+    
+    def __init__(self, max_days: int = 3650):
+        self.max_days = max_days
+    
+    def load_items(self, items: List[Item], start_date: datetime) -> Dict:
+        """
+        Copy the items (or rows with the same attributes) into arrays. The
+        expiry ordinal is the simulated day an item expires on: day d covers
+        (start + d - 1 days, start + d days]. Items already past their expiry
+        date expire on day 1, and items without one never do
+        """
+        count = len(items)
+        no_expiry = np.iinfo(np.int64).max
+        expiry_day = np.full(count, no_expiry, dtype=np.int64)
+        for index, item in enumerate(items):
+            if item.expiry_date:
+                days_left = (item.expiry_date - start_date) / timedelta(days=1)
+                expiry_day[index] = max(1, int(np.ceil(days_left)))
+        
+        # Expiry order, so each day's expiring items are one slice
+        expiry_order = np.argsort(expiry_day, kind="stable")
+        
+        return {
+            "ids": [item.id for item in items],
+            "index": {item.id: index for index, item in enumerate(items)},
+            "remaining_uses": np.array([item.remaining_uses for item in items], dtype=np.int64),
+            "expiry_day": expiry_day,
+            "expiry_order": expiry_order,
+            "sorted_expiry_day": expiry_day[expiry_order],
+            "mass": np.array([item.mass for item in items], dtype=np.float64),
+            "priority": np.array([item.priority for item in items], dtype=np.int64),
+            "is_waste": np.array([bool(item.is_waste) for item in items], dtype=bool)
+        }
+    
+    def get_usage_indices(self, state: Dict, item_ids: List[str], unknown_ids: set) -> np.ndarray:
+        """Array indices of the used item ids (one entry per use), collecting unknown ids"""
+        indices = []
+        for item_id in item_ids:
+            index = state["index"].get(item_id)
+            if index is None:
+                unknown_ids.add(item_id)
+            else:
+                indices.append(index)
+        return np.array(indices, dtype=np.int64)
+    
+    def run(self, items: List[Item], days: int, usage_schedule: Optional[Dict[int, List[str]]] = None,
+            daily_usage: Optional[List[str]] = None, start_date: datetime = None) -> Dict:
+        """
+        Simulate a number of days. Each day the scheduled uses (daily_usage plus
+        usage_schedule[day]) are applied first, then the day's expiries.
+        Returns per-day waste events, totals and the final state of the items
+        that changed
+        """
+        if days <= 0 or days > self.max_days:
+            return {"success": False, "message": f"Days must be between 1 and {self.max_days}"}
+        
+        usage_schedule = usage_schedule or {}
+        if any(day < 1 or day > days for day in usage_schedule):
+            return {"success": False, "message": "Usage schedule days must be within the simulated days"}
+        
+        if start_date is None:
+            start_date = datetime.now()
+        
+        logger.info(f"Simulating {days} days for {len(items)} items")
+        
+        state = self.load_items(items, start_date)
+        remaining_uses = state["remaining_uses"]
+        is_waste = state["is_waste"]
+        initial_uses = remaining_uses.copy()
+        initial_waste = is_waste.copy()
+        
+        # Resolve item ids once; the daily usage is the same array every day
+        unknown_ids = set()
+        daily_indices = self.get_usage_indices(state, daily_usage or [], unknown_ids)
+        scheduled_indices = {
+            day: self.get_usage_indices(state, item_ids, unknown_ids) for day, item_ids in usage_schedule.items()
+        }
+        
+        # Slice bounds of each day's expiring items in expiry order
+        expiry_bounds = np.searchsorted(state["sorted_expiry_day"], np.arange(1, days + 2), side="left")
+        
+        events = []
+        totals = {"itemUses": 0, "ignoredUses": 0, "expiredItems": 0, "usedUpItems": 0, "newWasteMass": 0.0}
+        
+        for day in range(1, days + 1):
+            used = daily_indices
+            if day in scheduled_indices:
+                used = np.concatenate((daily_indices, scheduled_indices[day]))
+            
+            used_up = np.empty(0, dtype=np.int64)
+            if len(used):
+                # Waste can no longer be used; repeated ids count as several uses
+                valid = ~is_waste[used]
+                totals["ignoredUses"] += int(len(used) - np.count_nonzero(valid))
+                totals["itemUses"] += int(np.count_nonzero(valid))
+                used_items, use_counts = np.unique(used[valid], return_counts=True)
+                remaining_uses[used_items] -= use_counts
+                used_up = used_items[remaining_uses[used_items] <= 0]
+                is_waste[used_up] = True
+            
+            expiring = state["expiry_order"][expiry_bounds[day - 1]:expiry_bounds[day]]
+            expired = expiring[~is_waste[expiring]]
+            is_waste[expired] = True
+            
+            if len(used_up) or len(expired):
+                waste_mass = float(state["mass"][used_up].sum() + state["mass"][expired].sum())
+                totals["usedUpItems"] += len(used_up)
+                totals["expiredItems"] += len(expired)
+                totals["newWasteMass"] += waste_mass
+                events.append({
+                    "day": day,
+                    "date": (start_date + timedelta(days=day)).isoformat(),
+                    "expiredItems": self.get_event_ids(state, expired),
+                    "usedUpItems": self.get_event_ids(state, used_up),
+                    "wasteMass": waste_mass
+                })
+        
+        totals["newWasteItems"] = totals["expiredItems"] + totals["usedUpItems"]
+        
+        changed_uses = np.flatnonzero(remaining_uses != initial_uses)
+        new_waste = np.flatnonzero(is_waste & ~initial_waste)
+        
+        return {
+            "success": True,
+            "date": {
+                "from": start_date.isoformat(),
+                "to": (start_date + timedelta(days=days)).isoformat()
+            },
+            "events": events,
+            "totals": totals,
+            "unknownItems": sorted(unknown_ids),
+            "finalState": {
+                "remainingUses": {state["ids"][i]: int(remaining_uses[i]) for i in changed_uses},
+                "newWasteItems": [state["ids"][i] for i in new_waste]
+            }
+        }
+    
+    def get_event_ids(self, state: Dict, indices: np.ndarray) -> List[str]:
+        """Item ids of a day's event, highest priority first"""
+        ordered = indices[np.argsort(-state["priority"][indices], kind="stable")]
+        return [state["ids"][i] for i in ordered]
@@ -1,7 +1,12 @@
 from typing import List, Dict, Tuple, Optional
 import logging
-from datetime import datetime
+import math
+import time
+import numpy as np
+from datetime import datetime, timedelta
 from models import Item, Container, ItemPlacement
+from utils.space_optimizer import SpaceOptimizer
+from utils.retrieval_optimizer import RetrievalOptimizer
 
 logger = logging.getLogger(__name__)
 
@@ -10,50 +15,40 @@ class WasteManager:
     Class responsible for tracking waste items and planning cargo returns
     """
     
-    def __init__(self):
-        pass
-    
-    def identify_waste_items(self, items: List[Item], current_date: datetime = None) -> List[Item]:
-        """
-        Identify items that should be marked as waste (expired or used up)
-        """
-        if current_date is None:
-            current_date = datetime.now()
-        
-        waste_items = []
-        
-        for item in items:
-            # Skip items already marked as waste
-            if item.is_waste:
-                waste_items.append(item)
-                continue
-            
-            # Check expiry date
-            if item.expiry_date and item.expiry_date <= current_date:
-                waste_items.append(item)
-                continue
-            
-            # Check usage limit
-            if item.remaining_uses <= 0:
-                waste_items.append(item)
-                continue
-        
-        return waste_items
+    def __init__(self, space_optimizer: Optional[SpaceOptimizer] = None,
+                 retrieval_optimizer: Optional[RetrievalOptimizer] = None,
+                 mass_resolution: float = 0.1, max_mass_bins: int = 10000):
+        # Share the application's optimizers so their cached grids and indexes are reused
+        self.space_optimizer = space_optimizer or SpaceOptimizer()
+        self.retrieval_optimizer = retrieval_optimizer or RetrievalOptimizer()
+        # The disposal knapsack works on masses rounded up to mass_resolution kg,
+        # coarsened as needed so the table never exceeds max_mass_bins columns
+        self.mass_resolution = mass_resolution
+        self.max_mass_bins = max_mass_bins
     
     def plan_waste_disposal(self, waste_items: List[Item], undocking_container: Container,
                           current_placements: List[ItemPlacement], 
-                          weight_limit: float = None) -> Dict:
+                          weight_limit: float = None,
+                          containers: Optional[List[Container]] = None,
+                          items: Optional[List[Item]] = None) -> Dict:
         """
         Plan the disposal of waste items for undocking
-        Returns disposal plan with instructions
+        Returns disposal plan with instructions.
+        With the source containers and the items stowed in them, the plan also
+        moves the items blocking the waste out of the way and back
         """
         logger.info(f"Planning waste disposal for {len(waste_items)} items")
         
-        # Get current waste items in the undocking container
+        waste_by_id = {item.id: item for item in waste_items}
+        
+        # Get current waste items in the undocking container, and the space taken there
         undocking_items = []
+        occupied_volume = 0.0
         for placement in current_placements:
             if placement.container_id == undocking_container.id:
-                item = next((i for i in waste_items if i.id == placement.item_id), None)
+                occupied_volume += (placement.end_width - placement.start_width) * \
+                    (placement.end_depth - placement.start_depth) * (placement.end_height - placement.start_height)
+                item = waste_by_id.get(placement.item_id)
                 if item:
                     undocking_items.append((item, placement))
         
@@ -64,84 +59,63 @@ class WasteManager:
         remaining_capacity = float('inf')
         if weight_limit:
             remaining_capacity = weight_limit - current_weight
+        free_volume = undocking_container.width * undocking_container.depth * undocking_container.height - \
+            occupied_volume
         
-        # Sort waste items by priority (lower priority first) and then by mass
-        # to maximize value of what gets loaded into undocking container
-        sorted_waste = sorted(
-            waste_items, 
-            key=lambda x: (x.priority, -x.mass)
-        )
+        # First placement of each item outside the undocking container
+        source_placements = {}
+        for placement in current_placements:
+            if placement.container_id != undocking_container.id:
+                source_placements.setdefault(placement.item_id, placement)
         
-        # Items to move to undocking container
-        items_to_move = []
+        # Candidates are the waste items stowed outside the undocking container that fit it at all
+        undocking_ids = {item.id for item, _ in undocking_items}
+        container_dims = sorted((undocking_container.width, undocking_container.depth, undocking_container.height))
+        candidates = [
+            item for item in waste_items
+            if item.id not in undocking_ids and item.id in source_placements and
+            all(a <= b for a, b in zip(sorted((item.width, item.depth, item.height)), container_dims))
+        ]
         
-        for item in sorted_waste:
-            # Skip items already in undocking container
-            if any(existing[0].id == item.id for existing in undocking_items):
-                continue
+        # Load as much waste mass as both the weight limit and the free volume allow
+        selected, solver_stats = self.select_disposal_items(candidates, remaining_capacity, free_volume)
+        
+        # Give every selected item a real position in the undocking container,
+        # largest first. Volume alone does not guarantee a 3D fit, so items
+        # the space optimizer cannot place are left out of the plan
+        undocking_placements = [p for p in current_placements if p.container_id == undocking_container.id]
+        planned_placements = []
+        positions = {}
+        unplaced_items = []
+        # Planned placements are recorded in the shared cached grid, so other
+        # requests must not search it until they are released again
+        with self.space_optimizer.lock:
+            for item in sorted(selected, key=lambda x: (-(x.width * x.depth * x.height), x.id)):
+                position = self.space_optimizer.find_placement_for_item(item, undocking_container, undocking_placements)
+                if position:
+                    positions[item.id] = position
+                    planned_placements.append(self.space_optimizer.record_placement(
+                        undocking_container, undocking_placements, item.id, position
+                    ))
+                else:
+                    unplaced_items.append(item.id)
             
-            # Check if we have capacity
-            if item.mass <= remaining_capacity:
-                items_to_move.append(item)
-                remaining_capacity -= item.mass
+            # The plan is not stowed yet, keep the cached grid in line with the real contents
+            for placement in reversed(planned_placements):
+                self.space_optimizer.release_placement(undocking_container, undocking_placements, placement)
         
-        # Generate disposal plan
-        steps = []
-        step_number = 1
-        manifest = []
+        # Lower priority first and then heavier first, as before
+        items_to_move = sorted(
+            (item for item in selected if item.id in positions), key=lambda x: (x.priority, -x.mass)
+        )
+        remaining_capacity -= sum(item.mass for item in items_to_move)
         
-        # Steps for moving items to undocking container
-        for item in items_to_move:
-            # Find current placement for this item
-            current_placement = next(
-                (p for p in current_placements if p.item_id == item.id and p.container_id != undocking_container.id),
-                None
-            )
-            
-            if current_placement:
-                # Add step to remove from current container
-                steps.append({
-                    "step": step_number,
-                    "action": "remove",
-                    "itemId": item.id,
-                    "fromContainer": current_placement.container_id,
-                    "fromPosition": {
-                        "startCoordinates": {
-                            "width": current_placement.start_width,
-                            "depth": current_placement.start_depth,
-                            "height": current_placement.start_height
-                        },
-                        "endCoordinates": {
-                            "width": current_placement.end_width,
-                            "depth": current_placement.end_depth,
-                            "height": current_placement.end_height
-                        }
-                    }
-                })
-                step_number += 1
-                
-                # Add step to place in undocking container
-                # For simplicity, we're not calculating exact position
-                steps.append({
-                    "step": step_number,
-                    "action": "place",
-                    "itemId": item.id,
-                    "toContainer": undocking_container.id,
-                    "toPosition": {
-                        "startCoordinates": {"width": 0, "depth": 0, "height": 0},
-                        "endCoordinates": {
-                            "width": item.width, "depth": item.depth, "height": item.height
-                        }
-                    }
-                })
-                step_number += 1
-                
-                # Add to manifest
-                manifest.append({
-                    "itemId": item.id,
-                    "name": item.name,
-                    "mass": item.mass
-                })
+        # Generate disposal plan
+        steps = self.build_disposal_steps(
+            items_to_move, positions, undocking_container, current_placements, source_placements,
+            containers, items
+        )
+        manifest = [{"itemId": item.id, "name": item.name, "mass": item.mass} for item in items_to_move]
         
         # Add existing items to manifest
         for item, _ in undocking_items:
@@ -159,20 +133,281 @@ class WasteManager:
             "totalItems": len(manifest),
             "totalMass": total_mass,
             "remainingCapacity": remaining_capacity if weight_limit else None,
+            "remainingVolume": free_volume - sum(item.width * item.depth * item.height for item in items_to_move),
             "manifest": manifest,
-            "disposalSteps": steps
+            "disposalSteps": steps,
+            "unplacedItems": unplaced_items,
+            "solveTimeMs": solver_stats["solveTimeMs"],
+            "optimalityGap": solver_stats["optimalityGap"]
         }
     
-    def simulate_time_advancement(self, items: List[Item], days: int = 1) -> Dict:
+    def build_disposal_steps(self, items_to_move: List[Item], positions: Dict[str, Dict],
+                             undocking_container: Container, current_placements: List[ItemPlacement],
+                             source_placements: Dict[str, ItemPlacement],
+                             containers: Optional[List[Container]] = None,
+                             items: Optional[List[Item]] = None) -> List[Dict]:
+        """
+        Steps to move the waste into the undocking container, one pass per source
+        container: blocking items come out once, the waste items are taken out and
+        the blocking items go back at the end of the pass. The waste is then loaded
+        back to front (deepest first, bottom up), so no item goes in behind one
+        already loaded
+        """
+        # Blocking items can be any item in a source container, waste or not
+        if items is None:
+            items = items_to_move
+        if containers is None:
+            containers = []
+        inventory = self.retrieval_optimizer.index_inventory(items, containers, current_placements)
+        
+        # Source containers in the order their first waste item is moved
+        targets_by_container = {}
+        for item in items_to_move:
+            placement = source_placements[item.id]
+            targets_by_container.setdefault(placement.container_id, []).append((item, placement))
+        
+        steps = []
+        for container_id, targets in targets_by_container.items():
+            container = inventory["containers"].get(container_id)
+            if container is None:
+                # Without the container's geometry, move the waste without blocking moves
+                retrieval_steps = [
+                    {"action": "retrieve", "itemId": item.id, "containerId": container_id,
+                     "position": placement.to_dict()["position"]}
+                    for item, placement in targets
+                ]
+            else:
+                retrieval_steps = self.retrieval_optimizer.build_container_retrieval_steps(
+                    container, targets, inventory, 1
+                )
+            
+            for retrieval_step in retrieval_steps:
+                if retrieval_step["action"] == "place":
+                    # Blocking item going back where it was
+                    steps.append({
+                        "step": len(steps) + 1,
+                        "action": "place",
+                        "itemId": retrieval_step["itemId"],
+                        "toContainer": container_id,
+                        "toPosition": retrieval_step["position"]
+                    })
+                    continue
+                
+                # Add step to remove from current container
+                steps.append({
+                    "step": len(steps) + 1,
+                    "action": "remove",
+                    "itemId": retrieval_step["itemId"],
+                    "fromContainer": container_id,
+                    "fromPosition": retrieval_step["position"]
+                })
+                
+        # Add steps to place the waste in the undocking container, the open face being at depth 0
+        loading_order = sorted(
+            items_to_move,
+            key=lambda x: (
+                -positions[x.id]["startCoordinates"]["depth"],
+                positions[x.id]["startCoordinates"]["height"],
+                positions[x.id]["startCoordinates"]["width"]
+            )
+        )
+        for item in loading_order:
+            steps.append({
+                "step": len(steps) + 1,
+                "action": "place",
+                "itemId": item.id,
+                "toContainer": undocking_container.id,
+                "toPosition": positions[item.id]
+            })
+        
+        return steps
+    
+    def select_disposal_items(self, candidates: List[Item], mass_capacity: float,
+                              volume_capacity: float) -> Tuple[List[Item], Dict]:
+        """
+        Choose the waste items that put the most mass into the undocking container
+        without exceeding its mass capacity or free volume (0/1 knapsack).
+        A DP over masses rounded up to the resolution finds the least volume for
+        every reachable mass; without a mass capacity only the volume limits the
+        load, so the DP runs over volumes instead. Rounding can leave room
+        unused, which a pass with the exact masses and volumes fills, and the
+        result is never worse than the greedy order used before. The gap is
+        measured against a fractional upper bound
+        """
+        started_at = time.perf_counter()
+        
+        mass_capacity = max(0.0, mass_capacity)
+        volume_capacity = max(0.0, volume_capacity)
+        
+        fitting = [
+            (item, item.width * item.depth * item.height) for item in candidates
+            if item.mass <= mass_capacity and item.width * item.depth * item.height <= volume_capacity
+        ]
+        
+        if mass_capacity == float('inf'):
+            selected = self.select_by_volume(fitting, volume_capacity)
+        else:
+            selected = self.select_by_mass(fitting, mass_capacity, volume_capacity)
+        selected = self.fill_remaining_capacity(selected, fitting, mass_capacity, volume_capacity)
+        
+        greedy = self.select_greedily(fitting, mass_capacity, volume_capacity)
+        if sum(item.mass for item in greedy) > sum(item.mass for item in selected):
+            selected = greedy
+        
+        # Fractional bound: the densest items (mass per volume) fill the free volume first
+        upper_bound = 0.0
+        volume_left = volume_capacity
+        for item, volume in sorted(
+            fitting, key=lambda x: x[0].mass / x[1] if x[1] > 0 else float('inf'), reverse=True
+        ):
+            if volume <= volume_left:
+                upper_bound += item.mass
+                volume_left -= volume
+            else:
+                upper_bound += item.mass * volume_left / volume
+                break
+        upper_bound = min(upper_bound, mass_capacity)
+        
+        loaded_mass = sum(item.mass for item in selected)
+        return selected, {
+            "solveTimeMs": round((time.perf_counter() - started_at) * 1000, 2),
+            "optimalityGap": round(max(0.0, upper_bound - loaded_mass) / upper_bound, 4) if upper_bound > 0 else 0.0
+        }
+    
+    def select_by_mass(self, fitting: List[Tuple[Item, float]], mass_capacity: float,
+                       volume_capacity: float) -> List[Item]:
+        """
+        Knapsack DP over masses rounded up to the resolution, keeping the least
+        volume for every reachable mass. Rounding up keeps the selection within
+        the real mass capacity. Items too light to take a mass bin are left out
+        """
+        resolution = max(self.mass_resolution, mass_capacity / self.max_mass_bins)
+        capacity_bins = int(math.floor(mass_capacity / resolution + 1e-9))
+        
+        packable = []
+        for item, volume in fitting:
+            weight = int(math.ceil(item.mass / resolution - 1e-9))
+            if 0 < weight <= capacity_bins:
+                packable.append((item, weight, volume))
+        
+        # min_volume[m] is the least volume loading exactly m mass bins
+        min_volume = np.full(capacity_bins + 1, np.inf)
+        min_volume[0] = 0.0
+        taken = np.zeros((len(packable), capacity_bins + 1), dtype=bool)
+        
+        for index, (_, weight, volume) in enumerate(packable):
+            with_item = min_volume[:-weight] + volume
+            improved = with_item < min_volume[weight:]
+            min_volume[weight:][improved] = with_item[improved]
+            taken[index, weight:] = improved
+        
+        # Heaviest reachable load that still fits in the free volume, then trace back its items
+        feasible = np.nonzero(min_volume <= volume_capacity + 1e-9)[0]
+        mass_bin = int(feasible[-1]) if len(feasible) else 0
+        selected = []
+        for index in range(len(packable) - 1, -1, -1):
+            if mass_bin > 0 and taken[index, mass_bin]:
+                item, weight, _ = packable[index]
+                selected.append(item)
+                mass_bin -= weight
+        selected.reverse()
+        return selected
+    
+    def select_by_volume(self, fitting: List[Tuple[Item, float]], volume_capacity: float) -> List[Item]:
+        """
+        Knapsack DP over volumes rounded up to whole bins, keeping the most mass
+        for every volume. Used when no mass capacity applies. Rounding up keeps
+        the selection within the free volume
+        """
+        if sum(volume for _, volume in fitting) <= volume_capacity + 1e-9:
+            return [item for item, _ in fitting]
+        
+        resolution = max(1.0, volume_capacity / self.max_mass_bins)
+        capacity_bins = int(math.floor(volume_capacity / resolution + 1e-9))
+        
+        # Items that take no volume bin cost nothing, the fill pass adds them
+        packable = []
+        for item, volume in fitting:
+            weight = int(math.ceil(volume / resolution - 1e-9))
+            if 0 < weight <= capacity_bins:
+                packable.append((item, weight))
+        
+        # max_mass[v] is the most mass loaded into at most v volume bins
+        max_mass = np.zeros(capacity_bins + 1)
+        taken = np.zeros((len(packable), capacity_bins + 1), dtype=bool)
+        
+        for index, (item, weight) in enumerate(packable):
+            with_item = max_mass[:-weight] + item.mass
+            improved = with_item > max_mass[weight:]
+            max_mass[weight:][improved] = with_item[improved]
+            taken[index, weight:] = improved
+        
+        volume_bin = capacity_bins
+        selected = []
+        for index in range(len(packable) - 1, -1, -1):
+            if taken[index, volume_bin]:
+                item, weight = packable[index]
+                selected.append(item)
+                volume_bin -= weight
+        selected.reverse()
+        return selected
+    
+    def fill_remaining_capacity(self, selected: List[Item], fitting: List[Tuple[Item, float]],
+                                mass_capacity: float, volume_capacity: float) -> List[Item]:
+        """
+        Add the unselected items, heaviest and then smallest first, that still fit
+        the exact mass and volume left. This takes back what rounding gave away
+        and loads the items too light for a mass bin
+        """
+        selected_ids = {item.id for item in selected}
+        selected = list(selected)
+        mass_left = mass_capacity - sum(item.mass for item in selected)
+        volume_left = volume_capacity - sum(item.width * item.depth * item.height for item in selected)
+        
+        for item, volume in sorted(fitting, key=lambda x: (-x[0].mass, x[1], x[0].id)):
+            if item.id not in selected_ids and item.mass <= mass_left + 1e-9 and volume <= volume_left + 1e-9:
+                selected.append(item)
+                mass_left -= item.mass
+                volume_left -= volume
+        return selected
+    
+    def select_greedily(self, fitting: List[Tuple[Item, float]], mass_capacity: float,
+                        volume_capacity: float) -> List[Item]:
+        """
+        The previous selection: lower priority first and then heavier first,
+        taking every item that still fits
+        """
+        selected = []
+        mass_left = mass_capacity
+        volume_left = volume_capacity
+        for item, volume in sorted(fitting, key=lambda x: (x[0].priority, -x[0].mass, x[0].id)):
+            if item.mass <= mass_left + 1e-9 and volume <= volume_left + 1e-9:
+                selected.append(item)
+                mass_left -= item.mass
+                volume_left -= volume
+        return selected
+    
+    def get_simulation_window(self, days: int, current_date: datetime = None) -> Tuple[datetime, datetime]:
+        """
+        Return the (from, to] dates of a time jump. Items expiring in this
+        window are the ones the jump turns into waste
+        """
+        if current_date is None:
+            current_date = datetime.now()
+        return current_date, current_date + timedelta(days=days)
+    
+    def simulate_time_advancement(self, items: List[Item], days: int = 1,
+                                  current_date: datetime = None) -> Dict:
         """
         Simulate the advancement of time by a number of days
-        Returns changes in item statuses
+        Returns changes in item statuses.
+        Only the given items are checked, so passing just the items expiring
+        in the window (see get_simulation_window) avoids a scan of the inventory
         """
         if days <= 0:
             return {"success": False, "message": "Days must be greater than 0"}
         
-        current_date = datetime.now()
-        new_date = current_date.replace(day=current_date.day + days)
+        current_date, new_date = self.get_simulation_window(days, current_date)
         
         changes = {
             "date": {
@@ -187,7 +422,7 @@ class WasteManager:
         for item in items:
             if item.is_waste:
                 continue
-                
+            
             if item.expiry_date and item.expiry_date <= new_date and item.expiry_date > current_date:
                 changes["expiredItems"].append({
                     "itemId": item.id,